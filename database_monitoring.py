@@ -1,21 +1,37 @@
 #!/usr/bin/env python3
 
+import argparse
+import atexit
 import configparser
 import logging
+import socket
+import threading
 import time
-
-from modules.database import Database
+from datetime import datetime
+
+from modules.deadline import Deadline
+from modules.notifications import NotificationDispatcher
+from modules.profiler import RunProfiler
+from modules.query_plans import QueryPlanTracker
+from modules.queue_logging import QueueLogging
+from modules.remediation import Remediation
+from modules.replay import Replay
+from modules.status_server import StatusServer
 from modules.sendmail import SendMail
-from modules.sensor_heartbeat import SensorHeartbeat
-from modules.sensors import Sensors
-from modules.system_heartbeat import SystemHeartbeat
+from modules.targets import Target
+from modules.watchdog import Watchdog
 
 CONFIG_FILE = '/mnt/dev/monitoring/Database_monitoring/config/database_monitoring.conf'
+# Extra time for the steps that were already running when the run deadline passed
+GRACE_PERIOD = 5
 
 CONFIG = None
 LOGGER = None
 SENDMAIL = None
-DATABASE = None
+REMEDIATION = None
+TARGETS = []
+STATUS_SERVER = None
+WATCHDOG = None
 
 
 def init():
@@ -23,42 +39,206 @@ def init():
     CONFIG = configparser.ConfigParser()
     CONFIG.read(CONFIG_FILE)
 
-    logging.basicConfig(
-        filename=CONFIG.get('LOGGER', 'FILE'),
-        format=CONFIG.get('LOGGER', 'FORMAT').replace('((', '%('),
-        level=logging.DEBUG)
+    queue_logging = QueueLogging(CONFIG)
+    queue_logging.start()
+    atexit.register(queue_logging.stop)
     global LOGGER
     LOGGER = logging.getLogger('database_monitoring')
 
 
-def main():
-    if not DATABASE.check_status_and_connect():
-        return
-
-    sensor_heartbeat = SensorHeartbeat(CONFIG, DATABASE, SENDMAIL)
-    if sensor_heartbeat.check_last_heartbeat():
-        heartbeats = sensor_heartbeat.heartbeats
-        sensors = Sensors(CONFIG, DATABASE, SENDMAIL, heartbeats)
-        sensors.check_battery_status()
-        sensors.check_temperature_status()
-        sensors.check_humidity_status()
-
-    system_heartbeat = SystemHeartbeat(CONFIG, DATABASE, SENDMAIL)
-    system_heartbeat.check_cpu()
-    system_heartbeat.check_memory()
-    system_heartbeat.check_sd_card()
-    system_heartbeat.check_dev_partition()
-    system_heartbeat.check_cloud_partition()
-    system_heartbeat.check_nas_partition()
+# Every cycle is recorded for the watchdog, a crash too
+def main(sequential=False):
+    WATCHDOG.start()
+    try:
+        deadline, status = check_targets(sequential)
+    except Exception as error:
+        WATCHDOG.finish(Watchdog.outcome_failed, repr(error))
+        raise
+
+    failed = [name for name, target in status['targets'].items() if target.get('error')]
+    if failed:
+        WATCHDOG.finish(Watchdog.outcome_failed, '; '.join(
+            '{0}: {1}'.format(name, status['targets'][name].get('message', 'unfinished checks')) for name in failed))
+    elif deadline.skipped:
+        WATCHDOG.finish(Watchdog.outcome_partial, 'skipped: ' + ', '.join(deadline.skipped))
+    else:
+        WATCHDOG.finish(Watchdog.outcome_ok)
+
+    if STATUS_SERVER is not None:
+        STATUS_SERVER.update(status)
+    return deadline
+
+
+# With sequential the targets are checked one after the other in the calling thread (for the profiler)
+def check_targets(sequential=False):
+    deadline = Deadline.from_config(CONFIG)
+    SENDMAIL.deadline = deadline
+
+    targets = {}
+    threads = {}
+    for target in TARGETS:
+        # A check still stuck in the previous cycle keeps the connection and the cache of its target
+        if not target.lock.acquire(blocking=False):
+            LOGGER.warning('The previous check of the %s target is still running, skipping it', target.name)
+            targets[target.name] = {'last_check': datetime.now(), 'error': True,
+                                    'skipped': ['previous check still running']}
+        elif sequential:
+            check_target(target, deadline, targets)
+        else:
+            # Daemon threads, so a check blocked on the network never keeps the process alive after the run
+            threads[target.name] = threading.Thread(target=check_target, args=[target, deadline, targets],
+                                                    name='Target-' + target.name, daemon=True)
+            threads[target.name].start()
+
+    for name, thread in threads.items():
+        thread.join(max(0.0, deadline.remaining() + GRACE_PERIOD))
+        if thread.is_alive():
+            deadline.skip(name + ': unfinished checks')
+            targets[name] = {'last_check': datetime.now(), 'error': True, 'skipped': ['unfinished checks']}
+    # A late check must not change the status of this cycle any more
+    targets = dict(targets)
+
+    status = {
+        'hostname': socket.gethostname(),
+        'last_check': datetime.now(),
+        'targets': targets,
+        'skipped': deadline.skipped,
+        'notifications': SENDMAIL.get_stats(),
+        'remediation': REMEDIATION.get_stats()
+    }
+    if deadline.skipped:
+        LOGGER.warning('Run deadline exceeded, skipped: %s', ', '.join(deadline.skipped))
+    return deadline, status
+
+
+def check_target(target, deadline, targets):
+    started = datetime.now()
+    try:
+        try:
+            status = target.check(deadline)
+            target.record_cycle(started, Watchdog.outcome_partial if status['skipped'] else Watchdog.outcome_ok)
+            target.finish()
+        except Exception as error:
+            LOGGER.exception('Checking the %s target failed', target.name)
+            status = {'last_check': started, 'error': True, 'message': repr(error)}
+            target.record_cycle(started, Watchdog.outcome_failed, repr(error))
+            target.close()
+        targets[target.name] = status
+    finally:
+        target.lock.release()
+
+
+def run_daemon():
+    interval = CONFIG.getfloat('DAEMON', 'INTERVAL', fallback=60)
+    while True:
+        started = time.monotonic()
+        try:
+            main()
+        except Exception:
+            LOGGER.exception('Monitoring cycle failed')
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def replay():
+    for target in TARGETS:
+        if not target.database.check_status_and_connect():
+            continue
+
+        history = Replay(target.config, target.database)
+        history.run()
+        if len(TARGETS) > 1:
+            print('[{0}]'.format(target.name))
+        print(history.format_report())
+
+        target.close()
+
+
+def explain(update_baseline):
+    for target in TARGETS:
+        target.database.query_log = {}
+    main()
 
-    DATABASE.close()
+    for target in TARGETS:
+        # The alert bookkeeping of the tracker must not be logged into the queries it is going through
+        query_log = target.database.query_log
+        target.database.query_log = None
+        target.database.deadline = None
+        if not query_log or not target.database.check_status_and_connect():
+            continue
+
+        tracker = QueryPlanTracker(target.config, target.database, SENDMAIL)
+        tracker.run(query_log, update_baseline)
+        if len(TARGETS) > 1:
+            print('[{0}]'.format(target.name))
+        print(tracker.format_report())
+
+        target.close()
+
+
+def profile():
+    profiler = RunProfiler(CONFIG)
+    profiler.run(lambda: main(sequential=True), [target.database for target in TARGETS], SENDMAIL,
+                 lambda run_deadline: run_deadline.remaining() + GRACE_PERIOD)
+    print(profiler.format_summary())
+    REMEDIATION.wait(REMEDIATION.timeout + GRACE_PERIOD)
+
+
+def watchdog():
+    problems = Watchdog(CONFIG, SendMail(CONFIG)).check()
+    for problem in problems.values():
+        print(problem)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Database, sensor and system monitoring')
+    parser.add_argument('--config', default=CONFIG_FILE, help='path of the configuration file')
+    parser.add_argument('--replay', action='store_true',
+                        help='replay the stored history against the configured thresholds and report '
+                             'how many alerts and e-mails it would have produced, without sending any')
+    parser.add_argument('--explain', action='store_true',
+                        help='run the checks once, then EXPLAIN ANALYZE every query they executed and compare the '
+                             'plans, timings and buffer usage with the stored baseline')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='with --explain, store the current plans as the new baseline')
+    parser.add_argument('--profile', action='store_true',
+                        help='run the checks once under cProfile and tracemalloc, and write a report and a pstats '
+                             'dump next to the log file')
+    parser.add_argument('--watchdog', action='store_true',
+                        help='only check the cycles recorded by the monitor, and e-mail if they failed, overran '
+                             'their budget or stopped arriving (run it from a separate cron entry)')
+    parser.add_argument('--daemon', action='store_true',
+                        help='keep running and check every DAEMON.INTERVAL seconds, serving the latest state '
+                             'as JSON on STATUS.HOST:STATUS.PORT')
+    return parser.parse_args()
 
 
 if __name__ == '__main__':
-    time.sleep(45)
-    init()
+    ARGUMENTS = parse_arguments()
+    CONFIG_FILE = ARGUMENTS.config
 
-    SENDMAIL = SendMail(CONFIG)
-    DATABASE = Database(CONFIG, SENDMAIL)
+    if not ARGUMENTS.replay and not ARGUMENTS.explain and not ARGUMENTS.profile and not ARGUMENTS.watchdog:
+        time.sleep(45)
+    init()
 
-    main()
+    SENDMAIL = NotificationDispatcher(CONFIG)
+    REMEDIATION = Remediation(CONFIG)
+    WATCHDOG = Watchdog(CONFIG)
+    TARGETS = Target.load(CONFIG, SENDMAIL, REMEDIATION, daemon=ARGUMENTS.daemon)
+
+    if ARGUMENTS.watchdog:
+        watchdog()
+    elif ARGUMENTS.replay:
+        replay()
+    elif ARGUMENTS.explain:
+        explain(ARGUMENTS.update_baseline)
+        SENDMAIL.flush(GRACE_PERIOD)
+    elif ARGUMENTS.profile:
+        profile()
+    elif ARGUMENTS.daemon:
+        STATUS_SERVER = StatusServer(CONFIG)
+        STATUS_SERVER.start()
+        run_daemon()
+    else:
+        RUN_DEADLINE = main()
+        SENDMAIL.flush(RUN_DEADLINE.remaining() + GRACE_PERIOD)
+        REMEDIATION.wait(REMEDIATION.timeout + GRACE_PERIOD)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+import logging
+
+
+# Common part of the checks that e-mail their alerts. An alert is claimed in the database before its e-mail is sent,
+# so it goes out once per name and check (from one monitor instance), released if it could not be delivered, and
+# cleared when the value is back to normal. Every evaluated value is collected in results for the check results
+# history.
+class AlertingChecks:
+    def __init__(self, config, database, send_mail, logger_name):
+        self.config = config
+        self.database = database
+        self.send_mail = send_mail
+        self.logger = logging.getLogger(logger_name)
+        self.results = []
+
+    def handle_normal(self, name, check):
+        self.logger.debug('%s %s is ok', name, check)
+        self.clear_alert(name, check)
+
+    def clear_alert(self, name, check):
+        email_notification = self.database.get_email_alert_notification(name, check)
+        if email_notification:
+            self.database.set_email_alert_notification(name, check)
+
+    # True if the alert was claimed and queued. When no sink can deliver it the claim is released, so the next run
+    # sends it again.
+    def send_alert(self, name, check, subject, message):
+        if not self.database.claim_email_alert_notification(name, check):
+            self.logger.debug('E-mail notification already sent')
+            return False
+
+        self.logger.info('E-mail notification needed')
+        self.send_mail.send(subject, message, on_failure=lambda: self.release_alert(name, check))
+        return True
+
+    def release_alert(self, name, check):
+        self.logger.warning('The %s %s alert could not be delivered, it is sent again on the next run', name, check)
+        self.database.release_email_alert_notification(name, check)
+
+    # Without a state the value is compared to the threshold as a maximum
+    def add_result(self, name, check, value, threshold, state=None):
+        self.results.append({
+            'name': name,
+            'check': check,
+            'value': value,
+            'threshold': threshold,
+            'state': state if state is not None else 'ok' if value < threshold else 'high'
+        })
@@ -1,34 +1,75 @@
 #!/usr/bin/env python3
 
+import json
 import logging
 import os
 import psycopg2
+import psycopg2.extras
 import socket
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
+
+from modules.deadline import DeadlineExceeded
+from modules.remediation import Remediation
 
 
 class Database:
     config_group_db = 'DATABASE'
     config_group_timeouts = 'TIMEOUTS'
     config_group_subjects = 'SUBJECTS'
+    config_group_sharding = 'SHARDING'
+    enabled = 'ENABLED'
     connection_string = 'CONNECTION_STRING'
     temp_file = 'TEMP_FILE'
+    statement_timeout = 'STATEMENT_TIMEOUT'
+    keepalives_idle = 'KEEPALIVES_IDLE'
+    keepalives_interval = 'KEEPALIVES_INTERVAL'
+    keepalives_count = 'KEEPALIVES_COUNT'
+    tcp_user_timeout = 'TCP_USER_TIMEOUT'
     db_connection_error = "DB_CONNECTION_ERROR"
 
-    def __init__(self, config, send_mail):
+    def __init__(self, config, send_mail, remediation=None):
         self.config = config
         self.send_mail = send_mail
+        self.remediation = remediation
         self.logger = logging.getLogger('Database')
         self.connection_string = config.get(self.config_group_db, self.connection_string)
         self.temp_file = config.get(self.config_group_db, self.temp_file)
+        # Default of the session, for the statements sent without the run deadline (e.g. the connection check)
+        self.statement_timeout = config.getfloat(self.config_group_db, self.statement_timeout, fallback=30)
         self.connection = None
         self.cursor = None
+        self.deadline = None
+        self.check_results_partitions = set()
+        self.query_log = None
+        self.exclusive_alerts = config.getboolean(self.config_group_sharding, self.enabled, fallback=False)
+        # Time spent waiting on the server (connecting and running the queries), for the profiler
+        self.wait_seconds = 0.0
 
     # If returns false an email will be sent
     def check_status_and_connect(self):
-        self.logger.debug('Checking database, with connection settings: ' + self.connection_string)
+        started = time.monotonic()
+        connected = self.is_connected()
+        self.wait_seconds += time.monotonic() - started
+        if connected:
+            self.logger.debug('Reusing the open database connection')
+            return True
+
+        self.logger.debug('Checking database, with connection settings: %s', self.connection_string)
         try:
-            self.connection = psycopg2.connect(self.connection_string)
+            started = time.monotonic()
+            try:
+                if self.deadline:
+                    self.deadline.check('connecting to the database')
+                    self.connection = psycopg2.connect(self.connection_string,
+                                                       connect_timeout=max(2, int(self.deadline.timeout())),
+                                                       options='-c statement_timeout={0}'.format(
+                                                           int(self.statement_timeout * 1000)),
+                                                       **self.get_socket_options())
+                else:
+                    self.connection = psycopg2.connect(self.connection_string, **self.get_socket_options())
+            finally:
+                self.wait_seconds += time.monotonic() - started
             self.cursor = self.connection.cursor()
             self.logger.debug('Connected to the database')
 
@@ -50,7 +91,7 @@ class Database:
                 number_of_lines = len(lines)
                 r_file.close()
                 print(lines)
-                self.logger.info('Found temporary file with {} lines'.format(number_of_lines))
+                self.logger.info('Found temporary file with %s lines', number_of_lines)
             except FileNotFoundError:
                 self.logger.debug('No temporary file found')
 
@@ -71,9 +112,10 @@ class Database:
             difference_in_minutes = int((end_datetime - start_datetime).total_seconds() / 60.0)
 
             timeout = float(self.config.get(self.config_group_timeouts, self.db_connection_error))
-            if int(timeout / 2) == difference_in_minutes:
+            if int(timeout / 2) == difference_in_minutes and self.remediation:
                 self.logger.info('Restarting postgresql service')
-                os.system('sudo systemctl restart postgresql')
+                self.remediation.run(Remediation.postgresql_restart,
+                                     Remediation.get_command(self.config, Remediation.postgresql_restart))
 
             if timeout < difference_in_minutes:
                 file.write('\n')
@@ -88,9 +130,24 @@ class Database:
                 self.send_error_mail()
                 return False
 
+    # statement_timeout is enforced by the server only, a dead server or a half-open connection is detected by the
+    # TCP keepalives, and with TCP_USER_TIMEOUT (milliseconds, libpq 12+) by the unacknowledged writes too
+    def get_socket_options(self):
+        options = {
+            'keepalives': 1,
+            'keepalives_idle': self.config.getint(self.config_group_db, self.keepalives_idle, fallback=5),
+            'keepalives_interval': self.config.getint(self.config_group_db, self.keepalives_interval, fallback=2),
+            'keepalives_count': self.config.getint(self.config_group_db, self.keepalives_count, fallback=3)
+        }
+        tcp_user_timeout = self.config.getint(self.config_group_db, self.tcp_user_timeout, fallback=0)
+        if tcp_user_timeout > 0:
+            options['tcp_user_timeout'] = tcp_user_timeout
+        return options
+
     def get_sensor_last_heartbeat(self, sensor):
         command = 'SELECT ' \
-                  '  * ' \
+                  '  name, ' \
+                  '  timestamp ' \
                   'FROM ' \
                   '  monitoring.sensor_data ' \
                   'WHERE ' \
@@ -98,24 +155,82 @@ class Database:
                   'ORDER BY ' \
                   '  timestamp DESC ' \
                   'LIMIT 1'
-        self.cursor.execute(command, [sensor])
+        self.execute(command, [sensor])
         result = self.cursor.fetchall()
 
+        if len(result) == 0:
+            return []
         return [dict(zip([key[0] for key in self.cursor.description], result[0]))]
 
     def get_system_last_heartbeat(self):
         command = 'SELECT ' \
-                  '  * ' \
+                  '  cpu_temp_celsius, ' \
+                  '  cpu0_usage_percent, ' \
+                  '  cpu1_usage_percent, ' \
+                  '  cpu2_usage_percent, ' \
+                  '  cpu3_usage_percent, ' \
+                  '  mem_usage_mb, ' \
+                  '  mem_total_mb, ' \
+                  '  sd_card_usage_gb, ' \
+                  '  sd_card_total_gb, ' \
+                  '  dev_usage_gb, ' \
+                  '  dev_total_gb, ' \
+                  '  cloud_usage_gb, ' \
+                  '  cloud_total_gb, ' \
+                  '  nas_usage_gb, ' \
+                  '  nas_total_gb ' \
                   'FROM ' \
                   '  monitoring.rpi_data ' \
                   'ORDER BY ' \
                   '  timestamp DESC ' \
                   'LIMIT 1'
-        self.cursor.execute(command)
+        self.execute(command)
         result = self.cursor.fetchall()
 
         return dict(zip([key[0] for key in self.cursor.description], result[0]))
 
+    # Adds the sensors of the new sensor_data rows to the registry. Only the rows since the newest registered heartbeat
+    # are read (with a small overlap for the late rows), so the timestamp index is used instead of a full scan.
+    def update_sensor_registry(self):
+        command = 'INSERT INTO ' \
+                  '  monitoring.sensor_registry(mac_address,name,first_seen,last_seen) ' \
+                  'SELECT ' \
+                  '  mac_address, ' \
+                  '  (array_agg(name ORDER BY timestamp DESC))[1], ' \
+                  '  min(timestamp), ' \
+                  '  max(timestamp) ' \
+                  'FROM ' \
+                  '  monitoring.sensor_data ' \
+                  'WHERE ' \
+                  '  timestamp > (SELECT ' \
+                  '                 coalesce(max(last_seen), \'-infinity\') - interval \'5 minutes\' ' \
+                  '               FROM ' \
+                  '                 monitoring.sensor_registry) ' \
+                  'GROUP BY ' \
+                  '  mac_address ' \
+                  'ON CONFLICT (mac_address) DO UPDATE SET ' \
+                  '  name = EXCLUDED.name, ' \
+                  '  first_seen = least(sensor_registry.first_seen, EXCLUDED.first_seen), ' \
+                  '  last_seen = greatest(sensor_registry.last_seen, EXCLUDED.last_seen)'
+        self.execute(command)
+        self.connection.commit()
+
+    def get_registered_sensors(self, max_age_days):
+        command = 'SELECT ' \
+                  '  mac_address, ' \
+                  '  name, ' \
+                  '  last_seen ' \
+                  'FROM ' \
+                  '  monitoring.sensor_registry ' \
+                  'WHERE ' \
+                  '  last_seen > localtimestamp - make_interval(days => %s) ' \
+                  'ORDER BY ' \
+                  '  mac_address'
+        self.execute(command, [max_age_days])
+        result = self.cursor.fetchall()
+
+        return {row[0]: {'name': row[1], 'timestamp': row[2]} for row in result}
+
     def get_sensor_battery_status(self, sensor):
         command = 'SELECT ' \
                   '  battery_percent ' \
@@ -126,7 +241,7 @@ class Database:
                   'ORDER BY ' \
                   '  timestamp DESC ' \
                   'LIMIT 1'
-        self.cursor.execute(command, [sensor])
+        self.execute(command, [sensor])
         result = self.cursor.fetchone()
 
         return result[0]
@@ -141,7 +256,7 @@ class Database:
                   'ORDER BY ' \
                   '  timestamp DESC ' \
                   'LIMIT 1'
-        self.cursor.execute(command, [sensor])
+        self.execute(command, [sensor])
         result = self.cursor.fetchone()
 
         return result[0]
@@ -156,21 +271,68 @@ class Database:
                   'ORDER BY ' \
                   '  timestamp DESC ' \
                   'LIMIT 1'
-        self.cursor.execute(command, [sensor])
+        self.execute(command, [sensor])
         result = self.cursor.fetchone()
 
         return result[0]
 
+    # Every statistic of the health checks in one round trip
+    def get_database_health(self):
+        command = 'SELECT ' \
+                  '  (SELECT count(*) FROM pg_stat_activity) AS connections, ' \
+                  '  current_setting(\'max_connections\')::int AS max_connections, ' \
+                  '  (SELECT coalesce(max(extract(epoch FROM now() - query_start)), 0) ' \
+                  '   FROM pg_stat_activity ' \
+                  '   WHERE state = \'active\' AND pid <> pg_backend_pid() AND backend_type = \'client backend\') ' \
+                  '    AS longest_query_seconds, ' \
+                  '  (SELECT coalesce(max(extract(epoch FROM now() - state_change)), 0) ' \
+                  '   FROM pg_stat_activity ' \
+                  '   WHERE state IN (\'idle in transaction\', \'idle in transaction (aborted)\')) ' \
+                  '    AS longest_idle_in_transaction_seconds, ' \
+                  '  (SELECT count(*) FROM pg_locks WHERE NOT granted) AS lock_waits, ' \
+                  '  (SELECT coalesce(sum(blks_hit) * 100.0 / nullif(sum(blks_hit) + sum(blks_read), 0), 100) ' \
+                  '   FROM pg_stat_database ' \
+                  '   WHERE datname = current_database()) AS cache_hit_ratio, ' \
+                  '  coalesce((SELECT n_dead_tup * 100.0 / nullif(n_live_tup + n_dead_tup, 0) ' \
+                  '            FROM pg_stat_user_tables ' \
+                  '            WHERE schemaname = \'monitoring\' AND relname = \'sensor_data\'), 0) ' \
+                  '    AS sensor_data_dead_tuples_percent, ' \
+                  '  coalesce((SELECT n_dead_tup * 100.0 / nullif(n_live_tup + n_dead_tup, 0) ' \
+                  '            FROM pg_stat_user_tables ' \
+                  '            WHERE schemaname = \'monitoring\' AND relname = \'rpi_data\'), 0) ' \
+                  '    AS rpi_data_dead_tuples_percent'
+        self.execute(command)
+        result = self.cursor.fetchone()
+
+        return {key[0]: float(value) for key, value in zip(self.cursor.description, result)}
+
+    # Round trip of a trivial query in milliseconds
+    def get_round_trip_time(self):
+        started = time.perf_counter()
+        self.execute('SELECT 1')
+        self.cursor.fetchone()
+        return (time.perf_counter() - started) * 1000
+
+    # Seconds since the newest row of the data tables, the max() is answered from the timestamp indexes
+    def get_ingest_lag(self):
+        command = 'SELECT ' \
+                  '  extract(epoch FROM localtimestamp - (SELECT max(timestamp) FROM monitoring.sensor_data)), ' \
+                  '  extract(epoch FROM localtimestamp - (SELECT max(timestamp) FROM monitoring.rpi_data))'
+        self.execute(command)
+        result = self.cursor.fetchone()
+
+        return [float(value) if value is not None else None for value in result]
+
     def get_email_alert_notification(self, name, alert_type):
         command = 'SELECT ' \
-                  '  * ' \
+                  '  id ' \
                   'FROM ' \
                   '  monitoring.email_alert_sent ' \
                   'WHERE ' \
                   '  name = %s AND ' \
                   '  type = %s AND ' \
                   '  valid = TRUE'
-        self.cursor.execute(command, [name, alert_type])
+        self.execute(command, [name, alert_type])
         result = self.cursor.fetchall()
 
         if len(result) == 0:
@@ -178,6 +340,18 @@ class Database:
         else:
             return [dict(zip([key[0] for key in self.cursor.description], result[0]))]
 
+    # Names with a valid alert of the type, to check many names against their alert state in one query
+    def get_email_alert_names(self, alert_type):
+        command = 'SELECT ' \
+                  '  name ' \
+                  'FROM ' \
+                  '  monitoring.email_alert_sent ' \
+                  'WHERE ' \
+                  '  type = %s AND ' \
+                  '  valid = TRUE'
+        self.execute(command, [alert_type])
+        return {row[0] for row in self.cursor.fetchall()}
+
     def set_email_alert_notification(self, name, alert_type):
         is_exists = self.get_email_alert_notification(name, alert_type)
         if is_exists:
@@ -192,12 +366,405 @@ class Database:
             command = 'INSERT INTO ' \
                       '  monitoring.email_alert_sent(name,type,valid,timestamp) ' \
                       'VALUES(%s,%s,True,now())'
-        self.cursor.execute(command, [name, alert_type])
+        self.execute(command, [name, alert_type])
+        self.connection.commit()
+
+    # Marks the alert as sent, true if the caller has to send it. With sharding it is one statement, true only for the
+    # instance that inserted the valid row: it relies on the partial unique index on (name, type) WHERE valid, so
+    # concurrent monitors send it once. A single monitor keeps the plain lookup, which needs no index.
+    def claim_email_alert_notification(self, name, alert_type):
+        if not self.exclusive_alerts:
+            if self.get_email_alert_notification(name, alert_type):
+                return False
+            self.set_email_alert_notification(name, alert_type)
+            return True
+
+        command = 'INSERT INTO ' \
+                  '  monitoring.email_alert_sent(name,type,valid,timestamp) ' \
+                  'VALUES(%s,%s,True,now()) ' \
+                  'ON CONFLICT (name, type) WHERE valid DO NOTHING ' \
+                  'RETURNING id'
+        self.execute(command, [name, alert_type])
+        result = self.cursor.fetchall()
+        self.connection.commit()
+
+        return len(result) > 0
+
+    # Called from the notification threads when no sink could deliver the alert, on a short connection of its own so
+    # it never shares the cursor of a running check. The next run claims and sends the alert again.
+    def release_email_alert_notification(self, name, alert_type):
+        command = 'UPDATE ' \
+                  '  monitoring.email_alert_sent ' \
+                  'SET ' \
+                  '  valid = FALSE ' \
+                  'WHERE ' \
+                  '  name = %s AND ' \
+                  '  type = %s AND ' \
+                  '  valid = TRUE'
+        connection = psycopg2.connect(self.connection_string, connect_timeout=max(2, int(self.statement_timeout)),
+                                      options='-c statement_timeout={0}'.format(int(self.statement_timeout * 1000)),
+                                      **self.get_socket_options())
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(command, [name, alert_type])
+            connection.commit()
+        finally:
+            connection.close()
+
+    def insert_monitor_cycle(self, instance, target, started, finished, outcome, error):
+        command = 'INSERT INTO ' \
+                  '  monitoring.monitor_cycles(instance,target,started,finished,duration_seconds,outcome,error) ' \
+                  'VALUES(%s,%s,%s,%s,%s,%s,%s)'
+        self.execute(command, [instance, target, started, finished, (finished - started).total_seconds(), outcome,
+                               error])
+        self.connection.commit()
+
+    # Heartbeat of this monitor instance, and the number of instances alive in the last lease_seconds
+    def update_monitor_instance(self, instance, lease_seconds):
+        command = 'INSERT INTO ' \
+                  '  monitoring.monitor_instances(instance,heartbeat) ' \
+                  'VALUES(%s,now()) ' \
+                  'ON CONFLICT (instance) DO UPDATE SET heartbeat = now()'
+        self.execute(command, [instance])
+
+        command = 'SELECT ' \
+                  '  count(*) ' \
+                  'FROM ' \
+                  '  monitoring.monitor_instances ' \
+                  'WHERE ' \
+                  '  heartbeat > now() - make_interval(secs => %s)'
+        self.execute(command, [lease_seconds])
+        result = self.cursor.fetchone()[0]
         self.connection.commit()
 
+        return result
+
+    # Renews the leases of this instance, gives back the ones above its fair share and takes over the expired ones.
+    # SKIP LOCKED keeps two instances from claiming the same shard, a dead instance's leases expire after
+    # lease_seconds and are picked up by the survivors on their next run. One statement per step, all in one
+    # transaction.
+    def acquire_shard_leases(self, instance, shards, fair_share, lease_seconds):
+        command = 'INSERT INTO ' \
+                  '  monitoring.monitor_leases(shard,owner,expires) ' \
+                  'SELECT ' \
+                  '  generate_series(0, %s - 1), NULL, now() ' \
+                  'ON CONFLICT (shard) DO NOTHING'
+        self.execute(command, [shards])
+
+        command = 'UPDATE ' \
+                  '  monitoring.monitor_leases ' \
+                  'SET ' \
+                  '  expires = now() + make_interval(secs => %s) ' \
+                  'WHERE ' \
+                  '  owner = %s AND ' \
+                  '  shard < %s'
+        self.execute(command, [lease_seconds, instance, shards])
+
+        command = 'UPDATE ' \
+                  '  monitoring.monitor_leases ' \
+                  'SET ' \
+                  '  owner = NULL, ' \
+                  '  expires = now() ' \
+                  'WHERE ' \
+                  '  shard IN (' \
+                  '    SELECT shard FROM monitoring.monitor_leases ' \
+                  '    WHERE owner = %s ' \
+                  '    ORDER BY shard DESC ' \
+                  '    LIMIT greatest((SELECT count(*) FROM monitoring.monitor_leases WHERE owner = %s) - %s, 0))'
+        self.execute(command, [instance, instance, fair_share])
+
+        command = 'UPDATE ' \
+                  '  monitoring.monitor_leases ' \
+                  'SET ' \
+                  '  owner = %s, ' \
+                  '  expires = now() + make_interval(secs => %s) ' \
+                  'WHERE ' \
+                  '  shard IN (' \
+                  '    SELECT shard FROM monitoring.monitor_leases ' \
+                  '    WHERE expires < now() AND shard < %s ' \
+                  '    ORDER BY shard ' \
+                  '    LIMIT greatest(%s - (SELECT count(*) FROM monitoring.monitor_leases WHERE owner = %s), 0) ' \
+                  '    FOR UPDATE SKIP LOCKED)'
+        self.execute(command, [instance, lease_seconds, shards, fair_share, instance])
+
+        command = 'SELECT ' \
+                  '  shard ' \
+                  'FROM ' \
+                  '  monitoring.monitor_leases ' \
+                  'WHERE ' \
+                  '  owner = %s AND ' \
+                  '  shard < %s ' \
+                  'ORDER BY ' \
+                  '  shard'
+        self.execute(command, [instance, shards])
+        result = [row[0] for row in self.cursor.fetchall()]
+        self.connection.commit()
+
+        return result
+
+    # Every query gets the remaining time of the run as statement_timeout, in the same round trip. Only the queries
+    # that succeeded are logged for --explain.
+    def execute(self, command, parameters=None):
+        self.run_with_deadline(command, lambda prefix: self.cursor.execute(prefix + command, parameters))
+        if self.query_log is not None and command not in self.query_log:
+            self.query_log[command] = parameters
+
+    def run_with_deadline(self, command, run):
+        if self.deadline is None:
+            self.timed(run, '')
+            return
+
+        self.deadline.check(command)
+        timeout = int(self.deadline.timeout() * 1000)
+        try:
+            self.timed(run, 'SET statement_timeout = {0}; '.format(timeout))
+        except psycopg2.extensions.QueryCanceledError:
+            self.connection.rollback()
+            raise DeadlineExceeded(command)
+
+    def timed(self, run, prefix):
+        started = time.monotonic()
+        try:
+            run(prefix)
+        finally:
+            self.wait_seconds += time.monotonic() - started
+
+    # Every result of the run in a single multi-row INSERT. The monthly partition is looked up in the catalog once per
+    # process, it is only created (and the old ones dropped) when it is missing, which is when a new month starts
+    def insert_check_results(self, target, timestamp, results, retention_months=0):
+        partition = 'check_results_' + timestamp.strftime('%Y_%m')
+        if partition not in self.check_results_partitions:
+            if not self.check_results_partition_exists(partition):
+                self.create_check_results_partition(partition, timestamp)
+                if retention_months > 0:
+                    self.drop_old_check_results_partitions(timestamp, retention_months)
+            self.check_results_partitions.add(partition)
+
+        command = 'INSERT INTO ' \
+                  '  monitoring.check_results(timestamp,target,name,type,value,threshold,state) ' \
+                  'VALUES %s'
+        rows = [(timestamp, target, result['name'], result['check'], result['value'], result['threshold'],
+                 result['state']) for result in results]
+        self.run_with_deadline(command, lambda prefix: psycopg2.extras.execute_values(
+            self.cursor, prefix + command, rows, page_size=max(1, len(rows))))
+        self.connection.commit()
+
+    def check_results_partition_exists(self, partition):
+        self.execute('SELECT to_regclass(%s)', ['monitoring.' + partition])
+        result = self.cursor.fetchone()[0] is not None
+        self.connection.commit()
+
+        return result
+
+    def create_check_results_partition(self, partition, timestamp):
+        month_start = timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        next_month_start = (month_start + timedelta(days=32)).replace(day=1)
+        command = 'CREATE TABLE IF NOT EXISTS ' \
+                  '  monitoring.{0} ' \
+                  'PARTITION OF ' \
+                  '  monitoring.check_results ' \
+                  'FOR VALUES FROM (\'{1}\') TO (\'{2}\')'.format(
+                      partition, month_start.strftime('%Y-%m-%d'), next_month_start.strftime('%Y-%m-%d'))
+        self.logger.info('Creating the %s partition', partition)
+        self.execute(command)
+        self.connection.commit()
+
+    def drop_old_check_results_partitions(self, timestamp, retention_months):
+        month = timestamp.year * 12 + timestamp.month - 1 - retention_months
+        oldest = 'check_results_{0:04d}_{1:02d}'.format(month // 12, month % 12 + 1)
+        command = 'SELECT ' \
+                  '  child.relname ' \
+                  'FROM ' \
+                  '  pg_inherits ' \
+                  '  JOIN pg_class parent ON parent.oid = pg_inherits.inhparent ' \
+                  '  JOIN pg_class child ON child.oid = pg_inherits.inhrelid ' \
+                  '  JOIN pg_namespace ON pg_namespace.oid = parent.relnamespace ' \
+                  'WHERE ' \
+                  '  pg_namespace.nspname = \'monitoring\' AND ' \
+                  '  parent.relname = \'check_results\''
+        self.execute(command)
+        for partition in sorted(row[0] for row in self.cursor.fetchall()):
+            if partition < oldest:
+                self.logger.info('Dropping the %s partition', partition)
+                self.execute('DROP TABLE monitoring.{0}'.format(partition))
+        self.connection.commit()
+
+    def explain(self, command, parameters):
+        self.cursor.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + command, parameters)
+        result = self.cursor.fetchone()[0]
+        self.connection.rollback()
+
+        return result[0] if isinstance(result, list) else json.loads(result)[0]
+
+    def get_query_plan_baseline(self, query_hash):
+        command = 'SELECT ' \
+                  '  fingerprint, ' \
+                  '  execution_ms, ' \
+                  '  shared_blocks ' \
+                  'FROM ' \
+                  '  monitoring.query_plan_baseline ' \
+                  'WHERE ' \
+                  '  query_hash = %s'
+        self.cursor.execute(command, [query_hash])
+        result = self.cursor.fetchall()
+
+        if len(result) == 0:
+            return None
+        else:
+            return dict(zip([key[0] for key in self.cursor.description], result[0]))
+
+    def set_query_plan_baseline(self, query_hash, query, fingerprint, execution_ms, shared_blocks):
+        command = 'INSERT INTO ' \
+                  '  monitoring.query_plan_baseline(query_hash,query,fingerprint,execution_ms,shared_blocks,timestamp) ' \
+                  'VALUES(%s,%s,%s,%s,%s,now()) ' \
+                  'ON CONFLICT (query_hash) DO UPDATE SET ' \
+                  '  query = EXCLUDED.query, ' \
+                  '  fingerprint = EXCLUDED.fingerprint, ' \
+                  '  execution_ms = EXCLUDED.execution_ms, ' \
+                  '  shared_blocks = EXCLUDED.shared_blocks, ' \
+                  '  timestamp = EXCLUDED.timestamp'
+        self.cursor.execute(command, [query_hash, query, fingerprint, execution_ms, shared_blocks])
+        self.connection.commit()
+
+    # The newest `limit` rows of every sensor since `since`, so a long gap or the first load of many sensors doesn't
+    # fetch more rows than the cache keeps
+    def get_sensor_data_since(self, since, limit):
+        command = 'SELECT ' \
+                  '  mac_address, ' \
+                  '  timestamp, ' \
+                  '  room_temp_celsius, ' \
+                  '  room_humdity_percent, ' \
+                  '  battery_percent ' \
+                  'FROM (' \
+                  '  SELECT ' \
+                  '    mac_address, ' \
+                  '    timestamp, ' \
+                  '    room_temp_celsius, ' \
+                  '    room_humdity_percent, ' \
+                  '    battery_percent, ' \
+                  '    row_number() OVER (PARTITION BY mac_address ORDER BY timestamp DESC) AS position ' \
+                  '  FROM ' \
+                  '    monitoring.sensor_data ' \
+                  '  WHERE ' \
+                  '    timestamp > %s' \
+                  ') AS recent ' \
+                  'WHERE ' \
+                  '  position <= %s ' \
+                  'ORDER BY ' \
+                  '  timestamp'
+        self.execute(command, [since, limit])
+        return self.cursor.fetchall()
+
+    def get_system_data_since(self, since, limit):
+        command = 'SELECT ' \
+                  '  * ' \
+                  'FROM (' \
+                  '  SELECT ' \
+                  '    timestamp, ' \
+                  '    cpu_temp_celsius, ' \
+                  '    cpu0_usage_percent, ' \
+                  '    cpu1_usage_percent, ' \
+                  '    cpu2_usage_percent, ' \
+                  '    cpu3_usage_percent, ' \
+                  '    mem_usage_mb, ' \
+                  '    mem_total_mb, ' \
+                  '    sd_card_usage_gb, ' \
+                  '    sd_card_total_gb ' \
+                  '  FROM ' \
+                  '    monitoring.rpi_data ' \
+                  '  WHERE ' \
+                  '    timestamp > %s ' \
+                  '  ORDER BY ' \
+                  '    timestamp DESC ' \
+                  '  LIMIT %s' \
+                  ') AS recent ' \
+                  'ORDER BY ' \
+                  '  timestamp'
+        self.execute(command, [since, limit])
+        return self.cursor.fetchall()
+
+    def stream_sensor_data(self, batch_size, sensors):
+        command = 'SELECT ' \
+                  '  mac_address, ' \
+                  '  timestamp, ' \
+                  '  battery_percent, ' \
+                  '  room_temp_celsius, ' \
+                  '  room_humdity_percent ' \
+                  'FROM ' \
+                  '  monitoring.sensor_data ' \
+                  'WHERE ' \
+                  '  mac_address = ANY(%s) ' \
+                  'ORDER BY ' \
+                  '  mac_address, ' \
+                  '  timestamp'
+        return self.stream(command, 'replay_sensor_data', batch_size, [list(sensors)])
+
+    def stream_system_data(self, batch_size):
+        command = 'SELECT ' \
+                  '  timestamp, ' \
+                  '  cpu_temp_celsius, ' \
+                  '  cpu0_usage_percent, ' \
+                  '  cpu1_usage_percent, ' \
+                  '  cpu2_usage_percent, ' \
+                  '  cpu3_usage_percent, ' \
+                  '  mem_usage_mb, ' \
+                  '  mem_total_mb, ' \
+                  '  sd_card_usage_gb, ' \
+                  '  sd_card_total_gb, ' \
+                  '  dev_usage_gb, ' \
+                  '  dev_total_gb, ' \
+                  '  cloud_usage_gb, ' \
+                  '  cloud_total_gb, ' \
+                  '  nas_usage_gb, ' \
+                  '  nas_total_gb ' \
+                  'FROM ' \
+                  '  monitoring.rpi_data ' \
+                  'ORDER BY ' \
+                  '  timestamp'
+        return self.stream(command, 'replay_system_data', batch_size)
+
+    # Server-side named cursor, so only one batch is held in memory at a time
+    def stream(self, command, cursor_name, batch_size, parameters=None):
+        cursor = self.connection.cursor(name=cursor_name)
+        cursor.itersize = batch_size
+        try:
+            cursor.execute(command, parameters)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+            self.connection.rollback()
+
+    def is_connected(self):
+        if self.connection is None or self.connection.closed:
+            return False
+
+        try:
+            self.connection.rollback()
+            self.cursor.execute('SELECT 1')
+            self.cursor.fetchone()
+            self.connection.rollback()
+            return True
+        except psycopg2.Error:
+            self.logger.warning('The open database connection is broken, reconnecting')
+            self.close()
+            return False
+
+    # Ends the open transaction but keeps the connection for the next run
+    def release(self):
+        self.connection.rollback()
+
     def close(self):
-        self.cursor.close()
-        self.connection.close()
+        try:
+            self.cursor.close()
+            self.connection.close()
+        except psycopg2.Error:
+            pass
+        self.connection = None
+        self.cursor = None
 
     def get_mail_subject(self):
         self.config.get(self.config_group_subjects, self.db_connection_error)
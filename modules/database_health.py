@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+import socket
+from datetime import datetime
+
+from modules.alerts import AlertingChecks
+
+
+class DatabaseHealth(AlertingChecks):
+    config_group_health = 'DATABASE_HEALTH'
+    config_group_subjects = 'SUBJECTS'
+    name = 'NAME'
+    connection_usage_max = 'CONNECTION_USAGE_MAX'
+    long_query_max = 'LONG_QUERY_MAX'
+    idle_in_transaction_max = 'IDLE_IN_TRANSACTION_MAX'
+    lock_waits_max = 'LOCK_WAITS_MAX'
+    cache_hit_ratio_min = 'CACHE_HIT_RATIO_MIN'
+    dead_tuples_max = 'DEAD_TUPLES_MAX'
+    defaults = {
+        connection_usage_max: 80,
+        long_query_max: 300,
+        idle_in_transaction_max: 300,
+        lock_waits_max: 5,
+        cache_hit_ratio_min: 90,
+        dead_tuples_max: 20
+    }
+    descriptions = {
+        connection_usage_max: 'connection usage is {0:.2f}% of max_connections',
+        long_query_max: 'longest running query has been running for {0:.0f} seconds',
+        idle_in_transaction_max: 'longest idle in transaction session has been idle for {0:.0f} seconds',
+        lock_waits_max: 'number of sessions waiting for a lock is {0:.0f}',
+        cache_hit_ratio_min: 'cache hit ratio is {0:.2f}%',
+        dead_tuples_max: 'ratio of the dead tuples is {0:.2f}%'
+    }
+
+    def __init__(self, config, database, send_mail):
+        super().__init__(config, database, send_mail, 'DatabaseHealth')
+        self.name = config.get(self.config_group_health, self.name, fallback=socket.gethostname() + '_postgresql')
+        self.health = self.database.get_database_health()
+
+    def get_limit(self, check):
+        return self.config.getfloat(self.config_group_health, check, fallback=self.defaults[check])
+
+    def check_connections(self):
+        connection_usage = self.health['connections'] / self.health['max_connections'] * 100
+        self.check_max(self.name, self.connection_usage_max, connection_usage)
+
+    def check_long_running_queries(self):
+        self.check_max(self.name, self.long_query_max, self.health['longest_query_seconds'])
+
+    def check_idle_in_transaction(self):
+        self.check_max(self.name, self.idle_in_transaction_max, self.health['longest_idle_in_transaction_seconds'])
+
+    def check_lock_waits(self):
+        self.check_max(self.name, self.lock_waits_max, self.health['lock_waits'])
+
+    def check_cache_hit_ratio(self):
+        cache_hit_ratio = self.health['cache_hit_ratio']
+        limit = self.get_limit(self.cache_hit_ratio_min)
+
+        if cache_hit_ratio > limit:
+            self.handle_normal(self.name, self.cache_hit_ratio_min)
+        else:
+            self.handle_alert(self.name, self.cache_hit_ratio_min, cache_hit_ratio, limit)
+        self.add_result(self.name, self.cache_hit_ratio_min, cache_hit_ratio, limit,
+                        'ok' if cache_hit_ratio > limit else 'low')
+
+    def check_bloat(self):
+        self.check_max(self.name + '_sensor_data', self.dead_tuples_max,
+                       self.health['sensor_data_dead_tuples_percent'])
+        self.check_max(self.name + '_rpi_data', self.dead_tuples_max, self.health['rpi_data_dead_tuples_percent'])
+
+    def check_max(self, name, check, value):
+        limit = self.get_limit(check)
+
+        if value < limit:
+            self.handle_normal(name, check)
+        else:
+            self.handle_alert(name, check, value, limit)
+        self.add_result(name, check, value, limit, 'ok' if value < limit else 'high')
+
+    def handle_alert(self, name, check, value, limit):
+        self.logger.warning('%s %s: %s, limit: %s', name, check, value, limit)
+        self.send_alert(name, check, self.get_mail_subject(check), self.get_mail_message(name, check, value))
+
+    def get_mail_subject(self, check):
+        return self.config.get(self.config_group_subjects, check, fallback='Database health alert: ' + check)
+
+    def get_mail_message(self, name, check, value):
+        return \
+            '<html>' \
+            '  <body>' \
+            '    <p>The {0}s {1}</p>' \
+            '    <p>{2}</p>' \
+            '  </body>' \
+            '</html>'.format(name, self.descriptions[check].format(value), datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+import logging
+import threading
+import time
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+# Time budget of one monitoring run. The remaining time is handed down to every query (statement_timeout) and network
+# call (socket timeout), and the steps that couldn't run anymore are collected for the report of the run.
+class Deadline:
+    config_group_deadline = 'DEADLINE'
+    budget = 'BUDGET'
+    minimum_timeout = 1.0
+
+    def __init__(self, budget):
+        self.logger = logging.getLogger('Deadline')
+        self.budget = budget
+        self.expires = time.monotonic() + budget
+        self.lock = threading.Lock()
+        self.skipped = []
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.getfloat(cls.config_group_deadline, cls.budget, fallback=10))
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    # Timeout for the next blocking call, never more than the given limit nor the remaining budget
+    def timeout(self, limit=None):
+        remaining = max(self.minimum_timeout, self.remaining())
+        return remaining if limit is None else min(limit, remaining)
+
+    def check(self, what):
+        if self.expired():
+            raise DeadlineExceeded(what)
+
+    def skip(self, what):
+        self.logger.warning('Run deadline of %s seconds exceeded, skipping %s', self.budget, what)
+        with self.lock:
+            self.skipped.append(what)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import logging.handlers
+import queue
+import socket
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+from modules.sendmail import SendMail
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, burst):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Waits at most timeout seconds for a token, returns False if none became available
+    def take(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate if self.rate > 0 else timeout
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class FileSink:
+    path = 'PATH'
+
+    def __init__(self, config, config_group):
+        self.path = config.get(config_group, self.path)
+        self.lock = threading.Lock()
+
+    def send(self, subject, message_body, timeout=None):
+        line = json.dumps({
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'hostname': socket.gethostname(),
+            'subject': subject,
+            'message': message_body
+        })
+        with self.lock:
+            with open(self.path, 'a') as file:
+                file.write(line + '\n')
+
+
+class SyslogSink:
+    address = 'ADDRESS'
+
+    def __init__(self, config, config_group):
+        address = config.get(config_group, self.address, fallback='/dev/log')
+        if ':' in address:
+            host, port = address.rsplit(':', 1)
+            address = (host, int(port))
+        self.handler = logging.handlers.SysLogHandler(address=address)
+        self.handler.setFormatter(logging.Formatter('database_monitoring: %(message)s'))
+
+    def send(self, subject, message_body, timeout=None):
+        record = logging.LogRecord('SyslogSink', logging.WARNING, __file__, 0, '%s: %s',
+                                   (subject, message_body), None)
+        self.handler.emit(record)
+
+
+class WebhookSink:
+    url = 'URL'
+
+    def __init__(self, config, config_group):
+        self.url = config.get(config_group, self.url)
+
+    def send(self, subject, message_body, timeout=None):
+        body = json.dumps({
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'hostname': socket.gethostname(),
+            'subject': subject,
+            'message': message_body
+        }).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+
+
+# Delivers every notification to all configured sinks in parallel. Every sink has its own worker thread, timeout,
+# retry policy and rate limit, so a slow or failing channel only delays itself, never the checks or the other sinks.
+class NotificationDispatcher:
+    config_group_notifications = 'NOTIFICATIONS'
+    sinks = 'SINKS'
+    timeout = 'TIMEOUT'
+    retries = 'RETRIES'
+    retry_delay = 'RETRY_DELAY'
+    rate = 'RATE_PER_MINUTE'
+    burst = 'BURST'
+    sink_types = {
+        'mail': SendMail,
+        'file': FileSink,
+        'syslog': SyslogSink,
+        'webhook': WebhookSink
+    }
+
+    def __init__(self, config):
+        self.config = config
+        self.logger = logging.getLogger('NotificationDispatcher')
+        self.deadline = None
+        self.lock = threading.Lock()
+        self.channels = []
+        for name in json.loads(config.get(self.config_group_notifications, self.sinks, fallback='["mail"]')):
+            self.channels.append(self.create_channel(name))
+
+    def create_channel(self, name):
+        config_group = 'SINK_' + name.upper()
+        sink_type = self.config.get(config_group, 'TYPE', fallback=name)
+        if sink_type == 'mail':
+            sink = SendMail(self.config)
+        else:
+            sink = self.sink_types[sink_type](self.config, config_group)
+
+        channel = {
+            'name': name,
+            'sink': sink,
+            'timeout': self.config.getfloat(config_group, self.timeout, fallback=30),
+            'retries': self.config.getint(config_group, self.retries, fallback=2),
+            'retry_delay': self.config.getfloat(config_group, self.retry_delay, fallback=5),
+            'bucket': TokenBucket(self.config.getfloat(config_group, self.rate, fallback=60),
+                                  self.config.getfloat(config_group, self.burst, fallback=10)),
+            'queue': queue.Queue(),
+            'stats': {'sent': 0, 'failed': 0, 'dropped': 0, 'seconds': 0.0}
+        }
+        channel['thread'] = threading.Thread(
+            target=self.work, args=[channel], name='Notification-' + name, daemon=True)
+        channel['thread'].start()
+        return channel
+
+    # Same as SendMail.send, but returns immediately. on_failure is called from a sink thread when no sink could
+    # deliver the notification (e.g. to release the claim of the alert), before flush returns.
+    def send(self, subject, message_body, on_failure=None):
+        notification = {'pending': len(self.channels), 'delivered': False, 'on_failure': on_failure}
+        for channel in self.channels:
+            channel['queue'].put((subject, message_body, notification))
+
+    def work(self, channel):
+        while True:
+            subject, message_body, notification = channel['queue'].get()
+            try:
+                delivered = False
+                try:
+                    delivered = self.deliver(channel, subject, message_body)
+                finally:
+                    self.complete(notification, subject, delivered)
+            finally:
+                channel['queue'].task_done()
+
+    def complete(self, notification, subject, delivered):
+        with self.lock:
+            notification['pending'] -= 1
+            notification['delivered'] = notification['delivered'] or delivered
+            failed = notification['pending'] == 0 and not notification['delivered']
+        if failed and notification['on_failure'] is not None:
+            try:
+                notification['on_failure']()
+            except Exception:
+                self.logger.exception('Handling the undelivered notification failed: %s', subject)
+
+    def deliver(self, channel, subject, message_body):
+        name = channel['name']
+        if not channel['bucket'].take(channel['timeout']):
+            channel['stats']['dropped'] += 1
+            self.logger.error('Rate limit of the %s sink reached, dropping notification: %s', name, subject)
+            return False
+
+        for attempt in range(channel['retries'] + 1):
+            started = time.monotonic()
+            timeout = channel['timeout']
+            if self.deadline and not self.deadline.expired():
+                timeout = self.deadline.timeout(timeout)
+            try:
+                channel['sink'].send(subject, message_body, timeout=timeout)
+                channel['stats']['sent'] += 1
+                self.logger.debug('Notification sent through the %s sink', name)
+                return True
+            except Exception as error:
+                self.logger.warning('Sending through the %s sink failed (attempt %d): %s', name, attempt + 1, error)
+            finally:
+                channel['stats']['seconds'] += time.monotonic() - started
+            if attempt < channel['retries']:
+                time.sleep(channel['retry_delay'] * (2 ** attempt))
+
+        channel['stats']['failed'] += 1
+        self.logger.error('Giving up sending through the %s sink: %s', name, subject)
+        return False
+
+    # Waits at most timeout seconds for the queued notifications, returns False if some are still pending
+    def flush(self, timeout):
+        deadline = time.monotonic() + timeout
+        for channel in self.channels:
+            pending = channel['queue']
+            with pending.all_tasks_done:
+                while pending.unfinished_tasks:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.logger.error('%d notification(s) still pending on the %s sink',
+                                          pending.unfinished_tasks, channel['name'])
+                        return False
+                    pending.all_tasks_done.wait(remaining)
+        return True
+
+    def get_stats(self):
+        return {channel['name']: dict(channel['stats'], pending=channel['queue'].unfinished_tasks)
+                for channel in self.channels}
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+import socket
+import time
+from datetime import datetime
+
+import numpy as np
+
+from modules.alerts import AlertingChecks
+from modules.ring_buffer import RingBuffer
+
+
+# Measures the database round trip and the ingest lag of the data tables on every run, keeps them in a fixed-size
+# file-backed ring and alerts on the p95 of the recent window. A dead sensor is late alone, a lagging ingestion
+# pipeline makes the whole table late, a slow database shows up in the round trip.
+class Probes(AlertingChecks):
+    config_group_probes = 'PROBES'
+    config_group_db = 'DATABASE'
+    config_group_subjects = 'SUBJECTS'
+    name = 'NAME'
+    history_file = 'HISTORY_FILE'
+    capacity = 'CAPACITY'
+    window = 'WINDOW'
+    latency_p95_max = 'LATENCY_P95_MAX'
+    ingest_lag_p95_max = 'INGEST_LAG_P95_MAX'
+    temp_file = 'TEMP_FILE'
+    columns = ['timestamp', 'latency_ms', 'sensor_data_lag_seconds', 'rpi_data_lag_seconds']
+    percentiles = [50, 95, 99]
+
+    def __init__(self, config, database, send_mail):
+        super().__init__(config, database, send_mail, 'Probes')
+        self.name = config.get(self.config_group_probes, self.name, fallback=socket.gethostname() + '_postgresql')
+        self.window = config.getint(self.config_group_probes, self.window, fallback=60)
+        self.history = RingBuffer(
+            config.getint(self.config_group_probes, self.capacity, fallback=1440),
+            len(self.columns),
+            config.get(self.config_group_probes, self.history_file,
+                       fallback=config.get(self.config_group_db, self.temp_file) + '.probes'))
+        self.summary = {}
+
+    def measure(self):
+        latency = self.database.get_round_trip_time()
+        sensor_data_lag, rpi_data_lag = self.database.get_ingest_lag()
+        self.logger.debug('Round trip: %.2f ms, ingest lag: sensor_data %s s, rpi_data %s s',
+                          latency, sensor_data_lag, rpi_data_lag)
+        self.history.append([
+            time.time(),
+            latency,
+            np.nan if sensor_data_lag is None else sensor_data_lag,
+            np.nan if rpi_data_lag is None else rpi_data_lag
+        ])
+
+        for column, key in enumerate(self.columns[1:], 1):
+            values = self.history.percentiles(column, self.percentiles, self.window)
+            self.summary[key] = dict(zip(['p{0}'.format(p) for p in self.percentiles], values))
+        self.summary[self.columns[1]]['last'] = latency
+        self.summary[self.columns[2]]['last'] = sensor_data_lag
+        self.summary[self.columns[3]]['last'] = rpi_data_lag
+
+    def check_latency(self):
+        self.check_p95(self.name + '_latency', self.latency_p95_max, self.columns[1], 200)
+
+    def check_ingest_lag(self):
+        self.check_p95(self.name + '_sensor_data', self.ingest_lag_p95_max, self.columns[2], 600)
+        self.check_p95(self.name + '_rpi_data', self.ingest_lag_p95_max, self.columns[3], 600)
+
+    def check_p95(self, name, check, key, default_limit):
+        value = self.summary[key]['p95']
+        if value is None:
+            return
+        limit = self.config.getfloat(self.config_group_probes, check, fallback=default_limit)
+
+        if value < limit:
+            self.handle_normal(name, check)
+        else:
+            self.handle_alert(name, check, value, limit)
+        self.add_result(name, check, value, limit, 'ok' if value < limit else 'high')
+
+    def handle_alert(self, name, check, value, limit):
+        self.logger.warning('%s p95 is %.2f, above %s', name, value, limit)
+        self.send_alert(name, check, self.get_mail_subject(check), self.get_mail_message(name, check, value))
+
+    def get_mail_subject(self, check):
+        return self.config.get(self.config_group_subjects, check, fallback='Database performance alert: ' + check)
+
+    def get_mail_message(self, name, check, value):
+        unit = 'ms' if check == self.latency_p95_max else 'seconds'
+        return \
+            '<html>' \
+            '  <body>' \
+            '    <p>The {0}s p95 of the last {1} runs is {2:.2f} {3}</p>' \
+            '    <p>{4}</p>' \
+            '  </body>' \
+            '</html>'.format(name, self.window, value, unit, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+import cProfile
+import io
+import logging
+import pstats
+import time
+import tracemalloc
+from datetime import datetime
+
+from modules.sendmail import SendMail
+
+
+# Runs one monitoring cycle under cProfile and tracemalloc, and writes a report and a pstats dump next to the log
+# file. The wall time of the cycle is split into waiting on the database, waiting on the notification sinks and the
+# Python evaluation of the checks. The sinks send from their own threads, the SMTP time is taken from their stats.
+class RunProfiler:
+    config_group_logger = 'LOGGER'
+    config_group_profile = 'PROFILE'
+    file = 'FILE'
+    top = 'TOP'
+    frames = 'FRAMES'
+
+    def __init__(self, config):
+        self.config = config
+        self.logger = logging.getLogger('RunProfiler')
+        self.top = config.getint(self.config_group_profile, self.top, fallback=40)
+        self.frames = config.getint(self.config_group_profile, self.frames, fallback=10)
+        self.path = config.get(self.config_group_logger, self.file) + '.' + datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.timings = {}
+
+    def run(self, cycle, databases, send_mail, flush_timeout):
+        database_seconds = sum(database.wait_seconds for database in databases)
+        sink_seconds = self.get_sink_seconds(send_mail)
+        profile = cProfile.Profile()
+        tracemalloc.start(self.frames)
+        first_snapshot = tracemalloc.take_snapshot()
+
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            deadline = cycle()
+            flush_started = time.perf_counter()
+            send_mail.flush(flush_timeout(deadline))
+            flush_seconds = time.perf_counter() - flush_started
+        finally:
+            profile.disable()
+        total_seconds = time.perf_counter() - started
+
+        last_snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        database_seconds = sum(database.wait_seconds for database in databases) - database_seconds
+        sink_seconds = {name: seconds - sink_seconds.get(name, 0.0)
+                        for name, seconds in self.get_sink_seconds(send_mail).items()}
+        self.timings = {
+            'total': total_seconds,
+            'database': database_seconds,
+            'notifications': flush_seconds,
+            'smtp': sum(seconds for name, seconds in sink_seconds.items() if self.is_smtp(send_mail, name)),
+            'python': max(0.0, total_seconds - database_seconds - flush_seconds),
+            'sinks': sink_seconds,
+            'memory_current': current,
+            'memory_peak': peak
+        }
+
+        profile.dump_stats(self.path + '.pstats')
+        with open(self.path + '.profile.txt', 'w', encoding='utf-8') as file:
+            file.write(self.format_report(profile, first_snapshot, last_snapshot))
+        self.logger.info('Profile of the run written to %s.profile.txt and %s.pstats', self.path, self.path)
+        return deadline
+
+    @staticmethod
+    def get_sink_seconds(send_mail):
+        return {channel['name']: channel['stats']['seconds'] for channel in send_mail.channels}
+
+    @staticmethod
+    def is_smtp(send_mail, name):
+        return any(isinstance(channel['sink'], SendMail) for channel in send_mail.channels if channel['name'] == name)
+
+    def format_report(self, profile, first_snapshot, last_snapshot):
+        timings = self.timings
+        lines = [
+            'Monitoring run profile, {0}'.format(datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+            '',
+            '{0:<36}{1:>10.3f} s'.format('Total', timings['total']),
+            '{0:<36}{1:>10.3f} s'.format('Waiting on the database', timings['database']),
+            '{0:<36}{1:>10.3f} s'.format('Waiting on the notifications', timings['notifications']),
+            '{0:<36}{1:>10.3f} s'.format('Python evaluation', timings['python']),
+            '{0:<36}{1:>10.3f} s'.format('SMTP (sink threads)', timings['smtp'])
+        ]
+        for name, seconds in timings['sinks'].items():
+            lines.append('{0:<36}{1:>10.3f} s'.format('  ' + name + ' sink', seconds))
+        lines += [
+            '{0:<36}{1:>10.1f} KB'.format('Traced memory at the end', timings['memory_current'] / 1024),
+            '{0:<36}{1:>10.1f} KB'.format('Traced memory peak', timings['memory_peak'] / 1024),
+            '',
+            'Timings include the tracing overhead, the other threads are not profiled.',
+            '',
+            'Top allocations during the run:'
+        ]
+        for statistic in last_snapshot.compare_to(first_snapshot, 'lineno')[:self.top]:
+            lines.append('  ' + str(statistic))
+
+        for sort in ('cumulative', 'tottime'):
+            stream = io.StringIO()
+            pstats.Stats(profile, stream=stream).sort_stats(sort).print_stats(self.top)
+            lines += ['', 'Functions by {0} time:'.format(sort), stream.getvalue()]
+        return '\n'.join(lines)
+
+    def format_summary(self):
+        return 'Run: {0:.3f} s, database: {1:.3f} s, notifications: {2:.3f} s (SMTP {3:.3f} s), ' \
+               'Python: {4:.3f} s, peak memory: {5:.1f} KB\nReport: {6}\nStats: {7}'.format(
+                   self.timings['total'], self.timings['database'], self.timings['notifications'],
+                   self.timings['smtp'], self.timings['python'], self.timings['memory_peak'] / 1024,
+                   self.path + '.profile.txt', self.path + '.pstats')
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+import hashlib
+import socket
+from datetime import datetime
+
+import psycopg2
+
+from modules.alerts import AlertingChecks
+
+
+# Runs EXPLAIN (ANALYZE, BUFFERS) on every query a monitoring run executed, and compares the plan shape, the execution
+# time and the buffer usage with the stored baseline. A changed plan (e.g. an index scan turning into a seq scan as
+# sensor_data grows), or a slowdown or buffer growth over the tolerance is reported as a regression.
+class QueryPlanTracker(AlertingChecks):
+    config_group_query_plans = 'QUERY_PLANS'
+    config_group_subjects = 'SUBJECTS'
+    latency_tolerance = 'LATENCY_TOLERANCE'
+    latency_min_difference = 'LATENCY_MIN_DIFFERENCE'
+    buffers_tolerance = 'BUFFERS_TOLERANCE'
+    query_plan_regression = 'QUERY_PLAN_REGRESSION'
+    explained_commands = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+
+    def __init__(self, config, database, send_mail):
+        super().__init__(config, database, send_mail, 'QueryPlanTracker')
+        self.latency_tolerance = config.getfloat(self.config_group_query_plans, self.latency_tolerance, fallback=0.5)
+        self.latency_min_difference = config.getfloat(
+            self.config_group_query_plans, self.latency_min_difference, fallback=5)
+        self.buffers_tolerance = config.getfloat(self.config_group_query_plans, self.buffers_tolerance, fallback=0.5)
+        self.hostname = socket.gethostname()
+        self.report = []
+
+    def run(self, query_log, update_baseline=False):
+        for command, parameters in list(query_log.items()):
+            if not command.lstrip().upper().startswith(self.explained_commands):
+                continue
+
+            query_hash = hashlib.sha1(command.encode('utf-8')).hexdigest()[:16]
+            try:
+                plan = self.database.explain(command, parameters)
+            except psycopg2.Error as error:
+                self.database.connection.rollback()
+                message = (str(error).strip() or repr(error)).splitlines()[0]
+                self.logger.warning('Query %s is not explainable: %s', query_hash, message)
+                self.report.append({
+                    'query_hash': query_hash,
+                    'query': ' '.join(command.split()),
+                    'error': message
+                })
+                continue
+            fingerprint = self.get_fingerprint(plan['Plan'])
+            execution_ms = plan['Execution Time']
+            shared_blocks = plan['Plan'].get('Shared Hit Blocks', 0) + plan['Plan'].get('Shared Read Blocks', 0)
+            baseline = self.database.get_query_plan_baseline(query_hash)
+
+            problems = []
+            if baseline is None or update_baseline:
+                self.database.set_query_plan_baseline(query_hash, command, fingerprint, execution_ms, shared_blocks)
+            else:
+                problems = self.compare(baseline, fingerprint, execution_ms, shared_blocks)
+                if problems:
+                    self.handle_regression(query_hash, command, problems)
+                else:
+                    self.handle_normal(query_hash)
+
+            self.report.append({
+                'query_hash': query_hash,
+                'query': ' '.join(command.split()),
+                'fingerprint': fingerprint,
+                'execution_ms': execution_ms,
+                'shared_blocks': shared_blocks,
+                'baseline': baseline,
+                'problems': problems
+            })
+        return self.report
+
+    # Shape of the plan: node types, relations and indexes, without the costs and row estimates
+    def get_fingerprint(self, node):
+        return hashlib.sha1(self.describe(node).encode('utf-8')).hexdigest()[:16]
+
+    def describe(self, node):
+        description = '{0}:{1}:{2}:{3}'.format(
+            node['Node Type'], node.get('Relation Name', ''), node.get('Index Name', ''), node.get('Join Type', ''))
+        children = ','.join(self.describe(child) for child in node.get('Plans', []))
+        return description + '(' + children + ')'
+
+    def compare(self, baseline, fingerprint, execution_ms, shared_blocks):
+        problems = []
+        if fingerprint != baseline['fingerprint']:
+            problems.append('plan changed ({0} -> {1})'.format(baseline['fingerprint'], fingerprint))
+
+        baseline_ms = float(baseline['execution_ms'])
+        if execution_ms > baseline_ms * (1 + self.latency_tolerance) \
+                and execution_ms - baseline_ms > self.latency_min_difference:
+            problems.append('execution time {0:.2f} ms, baseline {1:.2f} ms'.format(execution_ms, baseline_ms))
+
+        baseline_blocks = int(baseline['shared_blocks'])
+        if shared_blocks > baseline_blocks * (1 + self.buffers_tolerance) and shared_blocks - baseline_blocks > 8:
+            problems.append('{0} shared buffers, baseline {1}'.format(shared_blocks, baseline_blocks))
+        return problems
+
+    def handle_normal(self, query_hash):
+        self.logger.debug('Query %s plan is ok', query_hash)
+        self.clear_alert(query_hash, self.query_plan_regression)
+
+    def handle_regression(self, query_hash, command, problems):
+        self.logger.warning('Query %s regressed: %s', query_hash, '; '.join(problems))
+        self.send_alert(query_hash, self.query_plan_regression, self.get_mail_subject(),
+                        self.get_mail_message(query_hash, command, problems))
+
+    def get_mail_subject(self):
+        return self.config.get(self.config_group_subjects, self.query_plan_regression,
+                               fallback='Monitoring query plan regression')
+
+    def get_mail_message(self, query_hash, command, problems):
+        return \
+            '<html>' \
+            '  <body>' \
+            '    <p>The monitoring query {0} on {1} regressed:</p>' \
+            '    <p>{2}</p>' \
+            '    <p><code>{3}</code></p>' \
+            '    <p>{4}</p>' \
+            '  </body>' \
+            '</html>'.format(query_hash, self.hostname, '<br />'.join(problems), ' '.join(command.split()),
+                             datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+    def format_report(self):
+        lines = ['{0:<18}{1:<18}{2:>14}{3:>10}  {4}'.format('QUERY', 'PLAN', 'TIME (MS)', 'BUFFERS', 'RESULT')]
+        for entry in self.report:
+            if 'error' in entry:
+                lines.append('{0:<18}{1:<18}{2:>14}{3:>10}  not explainable: {4}'.format(
+                    entry['query_hash'], '-', '-', '-', entry['error']))
+                lines.append('  ' + entry['query'][:150])
+                continue
+            if entry['baseline'] is None:
+                result = 'new baseline'
+            else:
+                result = '; '.join(entry['problems']) or 'ok'
+            lines.append('{0:<18}{1:<18}{2:>14.2f}{3:>10}  {4}'.format(
+                entry['query_hash'], entry['fingerprint'], entry['execution_ms'], entry['shared_blocks'], result))
+            lines.append('  ' + entry['query'][:150])
+        return '\n'.join(lines)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        line = {
+            'timestamp': datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S.%f'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line['exception'] = record.exc_text
+        return json.dumps(line, default=str)
+
+
+# The checks only put the log records into a queue, the JSON formatting, rotation and the (SD card) file writes are
+# done by the listener thread, so slow log I/O doesn't add latency to the monitoring runs.
+class QueueLogging:
+    config_group_logger = 'LOGGER'
+    file = 'FILE'
+    level = 'LEVEL'
+    max_bytes = 'MAX_BYTES'
+    backup_count = 'BACKUP_COUNT'
+
+    def __init__(self, config):
+        self.config = config
+        self.file = config.get(self.config_group_logger, self.file)
+        self.level = config.get(self.config_group_logger, self.level, fallback='DEBUG').upper()
+        self.max_bytes = config.getint(self.config_group_logger, self.max_bytes, fallback=10 * 1024 * 1024)
+        self.backup_count = config.getint(self.config_group_logger, self.backup_count, fallback=5)
+        self.queue = queue.SimpleQueue()
+        self.listener = None
+
+    def start(self):
+        file_handler = logging.handlers.RotatingFileHandler(
+            self.file, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter())
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(logging.handlers.QueueHandler(self.queue))
+        root.setLevel(self.level)
+
+        self.listener = logging.handlers.QueueListener(self.queue, file_handler, respect_handler_level=True)
+        self.listener.start()
+
+    # Flushes the queued records, has to be called before exiting
+    def stop(self):
+        if self.listener:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
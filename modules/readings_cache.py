@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import logging
+import socket
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from modules.ring_buffer import RingBuffer
+
+
+# Recent readings of every sensor and host in fixed-size in-memory rings, for the resident (daemon) monitor.
+# Only the rows newer than the last cached one are fetched, and never more than the capacity per sensor, the windowed
+# checks run on the local copy. The default capacity holds two hours of one reading per minute, twice the default trend
+# window, and a sensor takes 120 * 4 * 8 bytes = 3.75 KB.
+class ReadingsCache:
+    config_group_cache = 'READINGS_CACHE'
+    config_group_system = 'SYSTEM_VALUES'
+    capacity = 'CAPACITY'
+    history_hours = 'HISTORY_HOURS'
+    hostname = 'HOSTNAME'
+    sensor_columns = ['timestamp', 'temperature', 'humidity', 'battery']
+    host_columns = ['timestamp', 'cpu_temp', 'cpu_usage', 'mem_usage', 'sd_usage']
+
+    def __init__(self, config):
+        self.config = config
+        self.logger = logging.getLogger('ReadingsCache')
+        self.capacity = config.getint(self.config_group_cache, self.capacity, fallback=120)
+        self.history_hours = config.getfloat(self.config_group_cache, self.history_hours, fallback=2)
+        self.hostname = config.get(self.config_group_system, self.hostname, fallback=socket.gethostname())
+        self.sensors = {}
+        self.hosts = {}
+        self.last_sensor_timestamp = None
+        self.last_system_timestamp = None
+
+    def update(self, database):
+        started = time.monotonic()
+        since = datetime.now() - timedelta(hours=self.history_hours)
+
+        rows = database.get_sensor_data_since(self.last_sensor_timestamp or since, self.capacity)
+        if rows:
+            self.last_sensor_timestamp = rows[-1][1]
+            columns = list(zip(*rows))
+            sensors = np.asarray(columns[0], dtype=object)
+            values = np.column_stack([
+                self.to_epoch(columns[1]),
+                np.asarray(columns[2], dtype=float),
+                np.asarray(columns[3], dtype=float),
+                np.asarray(columns[4], dtype=float)
+            ])
+            # Grouped by sensor in one pass, the stable sort keeps the readings of a sensor in time order
+            names, positions = np.unique(sensors, return_inverse=True)
+            order = np.argsort(positions, kind='stable')
+            boundaries = np.cumsum(np.bincount(positions, minlength=len(names)))[:-1]
+            for sensor, sensor_values in zip(names, np.split(values[order], boundaries)):
+                if sensor not in self.sensors:
+                    self.sensors[sensor] = RingBuffer(self.capacity, len(self.sensor_columns))
+                self.sensors[sensor].extend(sensor_values)
+
+        system_rows = database.get_system_data_since(self.last_system_timestamp or since, self.capacity)
+        if system_rows:
+            self.last_system_timestamp = system_rows[-1][0]
+            columns = np.asarray([row[1:] for row in system_rows], dtype=float)
+            values = np.column_stack([
+                self.to_epoch([row[0] for row in system_rows]),
+                columns[:, 0],
+                columns[:, 1:5].mean(axis=1),
+                columns[:, 5] / columns[:, 6] * 100,
+                columns[:, 7] / columns[:, 8] * 100
+            ])
+            if self.hostname not in self.hosts:
+                self.hosts[self.hostname] = RingBuffer(self.capacity, len(self.host_columns))
+            self.hosts[self.hostname].extend(values)
+
+        self.logger.debug('Cached %d sensor and %d system rows in %.3f seconds',
+                          len(rows), len(system_rows), time.monotonic() - started)
+
+    @staticmethod
+    def to_epoch(timestamps):
+        return np.asarray(timestamps, dtype='datetime64[us]').astype(np.int64) / 1e6
+
+    # Readings of the last window_minutes, relative to the newest one
+    @staticmethod
+    def window(buffer, window_minutes):
+        values = buffer.values()
+        if len(values) == 0:
+            return values
+        return values[values[:, 0] >= values[-1, 0] - window_minutes * 60]
+
+    # Least-squares slope of a column per hour over the window, None if there are not enough readings
+    def rate_of_change(self, buffer, column, window_minutes):
+        values = self.window(buffer, window_minutes)
+        values = values[~np.isnan(values[:, column])]
+        if len(values) < 2:
+            return None
+
+        hours = (values[:, 0] - values[0, 0]) / 3600
+        hours_deviation = hours - hours.mean()
+        variance = np.dot(hours_deviation, hours_deviation)
+        if variance == 0:
+            return None
+        return float(np.dot(hours_deviation, values[:, column] - values[:, column].mean()) / variance)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import shlex
+import signal
+import subprocess
+import threading
+import time
+from datetime import datetime
+
+
+# Runs the remediation actions (service restarts) as background processes, so the checks keep going while they are
+# in flight. Every action has a hard timeout, a cooldown and there is a limit on the concurrently running actions.
+# The cooldowns and the running actions are kept in a state file too, so they hold between the cron runs.
+class Remediation:
+    config_group_remediation = 'REMEDIATION'
+    config_group_db = 'DATABASE'
+    state_file = 'STATE_FILE'
+    temp_file = 'TEMP_FILE'
+    timeout = 'TIMEOUT'
+    cooldown = 'COOLDOWN'
+    max_concurrent = 'MAX_CONCURRENT'
+    postgresql_restart = 'POSTGRESQL_RESTART'
+    bluetooth_restart = 'BLUETOOTH_RESTART'
+    default_commands = {
+        postgresql_restart: 'sudo systemctl restart postgresql',
+        bluetooth_restart: 'sudo systemctl restart bluetooth'
+    }
+
+    def __init__(self, config):
+        self.config = config
+        self.logger = logging.getLogger('Remediation')
+        self.timeout = config.getfloat(self.config_group_remediation, self.timeout, fallback=120)
+        self.cooldown = config.getfloat(self.config_group_remediation, self.cooldown, fallback=600)
+        self.max_concurrent = config.getint(self.config_group_remediation, self.max_concurrent, fallback=1)
+        self.state_file = config.get(self.config_group_remediation, self.state_file,
+                                     fallback=config.get(self.config_group_db, self.temp_file) + '.remediation')
+        self.lock = threading.Lock()
+        self.running = {}
+        self.outcomes = []
+
+    @classmethod
+    def get_command(cls, config, action):
+        return config.get(cls.config_group_remediation, action, fallback=cls.default_commands[action])
+
+    # Returns True if the action was started, it never waits for the action to finish
+    def run(self, action, command):
+        if not command:
+            self.logger.info('No command is set for %s, skipping', action)
+            return False
+
+        with self.lock, self.shared_state() as state:
+            now = time.time()
+            running = self.get_running(state)
+            if command in running:
+                self.logger.info('%s is already running', action)
+                return False
+            if now - state['last_started'].get(command, 0) < self.cooldown:
+                self.logger.info('%s is in cooldown, skipping', action)
+                return False
+            if len(running) >= self.max_concurrent:
+                self.logger.warning('%d remediation action(s) already running, skipping %s', len(running), action)
+                return False
+
+            self.logger.info('Starting %s: %s', action, command)
+            try:
+                process = subprocess.Popen(shlex.split(command), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                           stderr=subprocess.PIPE, start_new_session=True)
+            except OSError as error:
+                self.logger.error('Cannot start %s: %s', action, error)
+                self.record(state, action, command, datetime.now(), 0.0, None, False, str(error))
+                return False
+            self.running[command] = process
+            state['running'][command] = {'action': action, 'pid': process.pid, 'started': now}
+            state['last_started'][command] = now
+
+        thread = threading.Thread(target=self.watch, args=[action, command, process, datetime.now(), time.monotonic()],
+                                  name='Remediation-' + action, daemon=True)
+        thread.start()
+        return True
+
+    # The actions running in this process, or in an earlier run that is still alive. The ones left behind by a run
+    # that exited before they finished are recorded with an unknown outcome.
+    def get_running(self, state):
+        for command, entry in list(state['running'].items()):
+            if command in self.running:
+                continue
+            try:
+                os.kill(entry['pid'], 0)
+                continue
+            except ProcessLookupError:
+                pass
+            except PermissionError:
+                continue
+            del state['running'][command]
+            self.record(state, entry['action'], command, datetime.fromtimestamp(entry['started']),
+                        time.time() - entry['started'], None, False, 'the monitor exited before the action finished')
+        return state['running']
+
+    # Read-modify-write of the state file, locked against the other monitor processes
+    @contextlib.contextmanager
+    def shared_state(self):
+        with open(self.state_file + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as file:
+                    state = json.load(file)
+            except (OSError, ValueError):
+                state = {}
+            state.setdefault('running', {})
+            state.setdefault('last_started', {})
+            state.setdefault('outcomes', [])
+            yield state
+            with open(self.state_file + '.tmp', 'w', encoding='utf-8') as file:
+                json.dump(state, file, default=str)
+            os.replace(self.state_file + '.tmp', self.state_file)
+
+    def watch(self, action, command, process, started_at, started):
+        timed_out = False
+        try:
+            _, error_output = process.communicate(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            self.logger.error('%s did not finish in %s seconds, killing it', action, self.timeout)
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            _, error_output = process.communicate()
+
+        duration = time.monotonic() - started
+        error_output = error_output.decode('utf-8', 'replace').strip() if error_output else ''
+        if process.returncode == 0:
+            self.logger.info('%s finished in %.1f seconds', action, duration)
+        elif not timed_out:
+            self.logger.error('%s failed with exit code %s in %.1f seconds: %s',
+                              action, process.returncode, duration, error_output)
+        with self.lock, self.shared_state() as state:
+            del self.running[command]
+            state['running'].pop(command, None)
+            self.record(state, action, command, started_at, duration, process.returncode, timed_out, error_output)
+
+    def record(self, state, action, command, started_at, duration, return_code, timed_out, error_output):
+        outcome = {
+            'action': action,
+            'command': command,
+            'started': started_at,
+            'duration': duration,
+            'return_code': return_code,
+            'timed_out': timed_out,
+            'success': return_code == 0,
+            'error': error_output
+        }
+        self.outcomes.append(outcome)
+        del self.outcomes[:-100]
+        state['outcomes'] = state['outcomes'][-99:] + [outcome]
+
+    # Waits at most timeout seconds for the running actions, returns False if some are still running.
+    # A single run waits for the hard timeout, so the action is killed and its outcome recorded before exiting.
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self.lock:
+                if not self.running:
+                    return True
+            time.sleep(0.1)
+        with self.lock:
+            return not self.running
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'running': sorted(self.running),
+                'outcomes': list(self.outcomes)
+            }
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+
+import numpy as np
+
+from modules.sensor_heartbeat import SensorHeartbeat
+from modules.sensors import Sensors
+from modules.system_heartbeat import SystemHeartbeat
+
+
+# Replays the historical sensor_data and rpi_data rows through the same threshold and e-mail
+# notification rules as Sensors, SensorHeartbeat and SystemHeartbeat, without sending anything.
+# Every batch is evaluated with numpy; only the (few) changes of state are walked one by one.
+# A live run only sees the latest row, so the values are sampled once per cycle: the first row of every cycle.
+class Replay:
+    config_group_replay = 'REPLAY'
+    config_group_daemon = 'DAEMON'
+    batch_size = 'BATCH_SIZE'
+    cycle_seconds = 'CYCLE_SECONDS'
+    interval = 'INTERVAL'
+
+    def __init__(self, config, database):
+        self.config = config
+        self.database = database
+        self.logger = logging.getLogger('Replay')
+        self.batch_size = config.getint(self.config_group_replay, self.batch_size, fallback=50000)
+        self.cycle_seconds = config.getfloat(self.config_group_replay, self.cycle_seconds,
+                                             fallback=config.getfloat(self.config_group_daemon, self.interval,
+                                                                      fallback=60))
+        self.report = {}
+        self.sensor_states = {}
+        self.system_states = {}
+        self.rows = {'sensor_data': 0, 'rpi_data': 0}
+
+    def run(self):
+        self.replay_sensor_data()
+        self.replay_system_data()
+        return self.report
+
+    def count(self, check, alerts, mails):
+        if check not in self.report:
+            self.report[check] = {'alerts': 0, 'mails': 0}
+        self.report[check]['alerts'] += int(alerts)
+        self.report[check]['mails'] += int(mails)
+
+    # The sensors a live run would check: the configured ones, and with auto discovery the registered ones
+    def get_monitored_sensors(self):
+        sensors = set(json.loads(self.config.get(SensorHeartbeat.config_group_heartbeat, SensorHeartbeat.sensors,
+                                                 fallback='[]')))
+        if self.config.getboolean(SensorHeartbeat.config_group_heartbeat, SensorHeartbeat.auto_discovery,
+                                  fallback=False):
+            sensors.update(self.database.get_registered_sensors(self.config.getint(
+                SensorHeartbeat.config_group_heartbeat, SensorHeartbeat.discovery_max_age, fallback=7)))
+        return sorted(sensors)
+
+    def replay_sensor_data(self):
+        sensors = self.get_monitored_sensors()
+        self.logger.info('Replaying the data of %d sensors in batches of %d rows', len(sensors), self.batch_size)
+        for rows in self.database.stream_sensor_data(self.batch_size, sensors):
+            self.rows['sensor_data'] += len(rows)
+            columns = list(zip(*rows))
+            sensors = np.asarray(columns[0], dtype=object)
+            timestamps = np.asarray(columns[1], dtype='datetime64[s]').astype(np.int64)
+            battery = np.asarray(columns[2], dtype=float)
+            temperature = np.asarray(columns[3], dtype=float)
+            humidity = np.asarray(columns[4], dtype=float)
+
+            # Rows are ordered by sensor, so every sensor is a contiguous slice of the batch
+            bounds = np.flatnonzero(sensors[1:] != sensors[:-1]) + 1
+            starts = np.r_[0, bounds]
+            ends = np.r_[bounds, len(rows)]
+            for start, end in zip(starts, ends):
+                sensor = sensors[start]
+                if sensor not in self.sensor_states:
+                    self.sensor_states[sensor] = {'alerts': {}, 'last_codes': {}, 'last_timestamp': None}
+                state = self.sensor_states[sensor]
+                self.evaluate_heartbeat(state, timestamps[start:end])
+                sampled = self.sample_cycles(state, timestamps[start:end])
+                if not sampled.any():
+                    continue
+                self.evaluate_battery(state, battery[start:end][sampled])
+                self.evaluate_temperature(state, temperature[start:end][sampled])
+                self.evaluate_humidity(state, humidity[start:end][sampled])
+            self.logger.debug('Replayed %d sensor data rows', self.rows['sensor_data'])
+
+    # The first row of every cycle, also across the batches
+    def sample_cycles(self, state, timestamps):
+        cycles = timestamps // self.cycle_seconds
+        previous = np.r_[state.get('last_cycle', -1), cycles[:-1]]
+        state['last_cycle'] = cycles[-1]
+        return cycles != previous
+
+    # Every gap is counted for its sensor, the single e-mail of a live run that lost every sensor is not modelled
+    def evaluate_heartbeat(self, state, timestamps):
+        timeout = float(self.config.get(SensorHeartbeat.config_group_timeouts, SensorHeartbeat.sensor_connection_error))
+        if state['last_timestamp'] is not None:
+            timestamps = np.r_[state['last_timestamp'], timestamps]
+        state['last_timestamp'] = timestamps[-1]
+
+        lost = np.count_nonzero(np.diff(timestamps) > timeout * 60)
+        self.count(SensorHeartbeat.sensor_connection_error, lost, lost)
+
+    def evaluate_battery(self, state, values):
+        level_warning = float(self.config.get(Sensors.config_group_battery, Sensors.battery_warning))
+        level_error = float(self.config.get(Sensors.config_group_battery, Sensors.battery_error))
+        level_critical = float(self.config.get(Sensors.config_group_battery, Sensors.battery_critical))
+
+        # 0: normal, 1: warning, 2: error, 3: critical
+        codes = (values <= level_warning).astype(np.int8) + (values <= level_error) + (values <= level_critical)
+        self.count(Sensors.battery_warning, np.count_nonzero(codes == 1), 0)
+        self.count(Sensors.battery_error, np.count_nonzero(codes == 2), 0)
+        self.count(Sensors.battery_critical, np.count_nonzero(codes == 3), 0)
+
+        alerts = state['alerts']
+        for code in self.changed_codes(state, 'battery', codes):
+            # Same toggling as Sensors.handle_*_battery and Database.set_email_alert_notification
+            if code == 0:
+                self.toggle(alerts, Sensors.battery_critical, only_if=True)
+            elif code == 1 and not alerts.get(Sensors.battery_warning):
+                self.count(Sensors.battery_warning, 0, 1)
+                self.toggle(alerts, Sensors.battery_warning)
+            elif code == 2 and not alerts.get(Sensors.battery_error):
+                self.count(Sensors.battery_error, 0, 1)
+                self.toggle(alerts, Sensors.battery_warning)
+                self.toggle(alerts, Sensors.battery_error)
+            elif code == 3 and not alerts.get(Sensors.battery_critical):
+                self.count(Sensors.battery_critical, 0, 1)
+                self.toggle(alerts, Sensors.battery_error)
+                self.toggle(alerts, Sensors.battery_critical)
+
+    def evaluate_temperature(self, state, values):
+        group = Sensors.config_group_temperature
+        self.evaluate_range(
+            state, values, 'temperature', Sensors.temperature_min, Sensors.temperature_max,
+            float(self.config.get(group, Sensors.temperature_min)),
+            float(self.config.get(group, Sensors.temperature_min_cooldown)),
+            float(self.config.get(group, Sensors.temperature_max)),
+            float(self.config.get(group, Sensors.temperature_max_cooldown)))
+
+    def evaluate_humidity(self, state, values):
+        group = Sensors.config_group_humidity
+        self.evaluate_range(
+            state, values, 'humidity', Sensors.humidity_min, Sensors.humidity_max,
+            float(self.config.get(group, Sensors.humidity_min)),
+            float(self.config.get(group, Sensors.humidity_min_cooldown)),
+            float(self.config.get(group, Sensors.humidity_max)),
+            float(self.config.get(group, Sensors.humidity_max_cooldown)))
+
+    def evaluate_range(self, state, values, key, type_min, type_max, level_min, level_min_cooldown, level_max,
+                       level_max_cooldown):
+        low = values <= level_min
+        high = level_max <= values
+        normal = (level_min < values) & (values < level_max)
+        # Bits: 1 low, 2 high, 4 resets the low alert, 8 resets the high alert (outside the cooldown zones)
+        codes = low.astype(np.int8) \
+            | (high.astype(np.int8) << 1) \
+            | ((normal & (values > level_min_cooldown)).astype(np.int8) << 2) \
+            | ((normal & (values < level_max_cooldown)).astype(np.int8) << 3)
+        self.count(type_min, np.count_nonzero(low), 0)
+        self.count(type_max, np.count_nonzero(high), 0)
+
+        alerts = state['alerts']
+        for code in self.changed_codes(state, key, codes):
+            if code & 1 and not alerts.get(type_min):
+                self.count(type_min, 0, 1)
+                self.toggle(alerts, type_min)
+            if code & 2 and not alerts.get(type_max):
+                self.count(type_max, 0, 1)
+                self.toggle(alerts, type_max)
+            if code & 4:
+                self.toggle(alerts, type_min, only_if=True)
+            if code & 8:
+                self.toggle(alerts, type_max, only_if=True)
+
+    # Repeating the same state is a no-op for the notification logic, so only the first value of every run matters
+    @staticmethod
+    def changed_codes(state, key, codes):
+        last_code = state['last_codes'].get(key)
+        state['last_codes'][key] = codes[-1]
+        previous = np.r_[-1 if last_code is None else last_code, codes[:-1]]
+        return codes[codes != previous].tolist()
+
+    @staticmethod
+    def toggle(alerts, alert_type, only_if=None):
+        if only_if is None or alerts.get(alert_type, False) == only_if:
+            alerts[alert_type] = not alerts.get(alert_type, False)
+
+    def replay_system_data(self):
+        self.logger.info('Replaying system data in batches of %d rows', self.batch_size)
+        group = SystemHeartbeat.config_group_system
+        cpu_max_temp = float(self.config.get(group, SystemHeartbeat.cpu_temp_max))
+        cpu_max_usage = float(self.config.get(group, SystemHeartbeat.cpu_usage_max))
+        mem_max_usage = float(self.config.get(group, SystemHeartbeat.mem_usage_max))
+        sd_max_usage = float(self.config.get(group, SystemHeartbeat.sd_usage_max))
+        dev_max_usage = float(self.config.get(group, SystemHeartbeat.dev_usage_max))
+        cloud_max_usage = float(self.config.get(group, SystemHeartbeat.cloud_usage_max))
+        nas_max_usage = float(self.config.get(group, SystemHeartbeat.nas_usage_max))
+
+        for rows in self.database.stream_system_data(self.batch_size):
+            self.rows['rpi_data'] += len(rows)
+            timestamps = np.asarray([row[0] for row in rows], dtype='datetime64[s]').astype(np.int64)
+            sampled = self.sample_cycles(self.system_states, timestamps)
+            if not sampled.any():
+                continue
+            values = np.asarray([row[1:] for row in rows], dtype=float)[sampled]
+
+            self.evaluate_limit(SystemHeartbeat.cpu_temp_max, 'cpu_temp', values[:, 0], cpu_max_temp)
+            for core in range(4):
+                self.evaluate_limit(SystemHeartbeat.cpu_usage_max, 'cpu{0}_usage'.format(core),
+                                    values[:, 1 + core], cpu_max_usage)
+            self.evaluate_limit(SystemHeartbeat.mem_usage_max, 'mem_usage',
+                                values[:, 5] / values[:, 6] * 100, mem_max_usage)
+            self.evaluate_limit(SystemHeartbeat.sd_usage_max, 'sd_usage',
+                                values[:, 7] / values[:, 8] * 100, sd_max_usage)
+            self.evaluate_limit(SystemHeartbeat.dev_usage_max, 'dev_usage',
+                                values[:, 9] / values[:, 10] * 100, dev_max_usage)
+            self.evaluate_limit(SystemHeartbeat.cloud_usage_max, 'cloud_usage',
+                                values[:, 11] / values[:, 12] * 100, cloud_max_usage)
+            self.evaluate_limit(SystemHeartbeat.nas_usage_max, 'nas_usage',
+                                values[:, 13] / values[:, 14] * 100, nas_max_usage)
+            self.logger.debug('Replayed %d system data rows', self.rows['rpi_data'])
+
+    # SystemHeartbeat sends one e-mail when a value reaches its limit and resets when it drops below
+    def evaluate_limit(self, alert_type, key, values, limit):
+        alerts = values >= limit
+        previous = np.r_[self.system_states.get(key, False), alerts[:-1]]
+        self.system_states[key] = bool(alerts[-1])
+        self.count(alert_type, np.count_nonzero(alerts), np.count_nonzero(alerts & ~previous))
+
+    def format_report(self):
+        lines = ['Replayed {0} sensor_data and {1} rpi_data rows, the alerts are counted once per {2:.0f} second '
+                 'cycle'.format(self.rows['sensor_data'], self.rows['rpi_data'], self.cycle_seconds)]
+        lines.append('{0:<26}{1:>12}{2:>12}'.format('CHECK', 'ALERTS', 'MAILS'))
+        for check in sorted(self.report):
+            lines.append('{0:<26}{1:>12}{2:>12}'.format(
+                check, self.report[check]['alerts'], self.report[check]['mails']))
+        return '\n'.join(lines)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import os
+
+import numpy as np
+
+
+# Fixed-capacity ring of float64 rows, in memory or backed by a memory-mapped file.
+# The first row is the header, its first value is the number of rows ever appended.
+class RingBuffer:
+    def __init__(self, capacity, columns, path=None):
+        self.capacity = capacity
+        self.columns = columns
+        self.path = path
+        shape = (capacity + 1, columns)
+
+        if path is None:
+            self.data = np.full(shape, np.nan)
+            self.data[0] = 0
+        elif os.path.exists(path) and os.path.getsize(path) == shape[0] * shape[1] * 8:
+            self.data = np.memmap(path, dtype=np.float64, mode='r+', shape=shape)
+        else:
+            self.data = np.memmap(path, dtype=np.float64, mode='w+', shape=shape)
+            self.data[:] = np.nan
+            self.data[0] = 0
+            self.data.flush()
+
+    @property
+    def count(self):
+        return int(self.data[0, 0])
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, row):
+        self.extend(np.asarray(row, dtype=np.float64).reshape(1, self.columns))
+
+    def extend(self, rows):
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, self.columns)
+        if len(rows) == 0:
+            return
+
+        # Only the last capacity rows would survive anyway
+        count = self.count + len(rows)
+        rows = rows[-self.capacity:]
+        positions = (count - len(rows) + np.arange(len(rows))) % self.capacity + 1
+        self.data[positions] = rows
+        self.data[0, 0] = count
+        if isinstance(self.data, np.memmap):
+            self.data.flush()
+
+    # Rows from the oldest to the newest, the last size rows if size is given
+    def values(self, size=None):
+        length = len(self)
+        size = length if size is None else min(size, length)
+        positions = (self.count - size + np.arange(size)) % self.capacity + 1
+        return self.data[positions]
+
+    def last(self):
+        if self.count == 0:
+            return None
+        return self.data[(self.count - 1) % self.capacity + 1]
+
+    def percentiles(self, column, percentiles, size=None):
+        values = self.values(size)[:, column]
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return [None] * len(percentiles)
+        return np.percentile(values, percentiles).tolist()
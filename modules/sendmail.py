@@ -2,6 +2,7 @@
 
 import logging
 import smtplib
+import socket
 import ssl
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -19,7 +20,7 @@ class SendMail:
         self.config = config
         self.logger = logging.getLogger('SendMail')
 
-    def send(self, subject, message_body):
+    def send(self, subject, message_body, timeout=None):
         server = self.config.get(self.config_group_gmail, self.server)
         port = self.config.get(self.config_group_gmail, self.port)
         password = self.config.get(self.config_group_gmail, self.password)
@@ -34,7 +35,9 @@ class SendMail:
         message.attach(MIMEText(message_body, "html"))
 
         context = ssl.create_default_context()
-        with smtplib.SMTP_SSL(server, port, context=context) as server:
+        if timeout is None:
+            timeout = socket.getdefaulttimeout()
+        with smtplib.SMTP_SSL(server, port, context=context, timeout=timeout) as server:
             server.login(from_address, password)
             server.sendmail(from_address, to_address, message.as_string())
         self.logger.info("E-mail sent")
@@ -2,10 +2,11 @@
 
 import json
 import logging
-import os
 import socket
 from datetime import datetime
 
+from modules.remediation import Remediation
+
 
 class SensorHeartbeat:
     config_group_heartbeat = 'HEARTBEAT'
@@ -13,26 +14,34 @@ class SensorHeartbeat:
     config_group_subjects = 'SUBJECTS'
     sensor_connection_error = 'SENSOR_CONNECTION_ERROR'
     sensors = 'SENSORS'
+    auto_discovery = 'AUTO_DISCOVERY'
+    discovery_max_age = 'DISCOVERY_MAX_AGE'
     db_connection_error = 'DB_CONNECTION_ERROR'
+    config_group_system = 'SYSTEM_VALUES'
+    hostname = 'HOSTNAME'
 
-    def __init__(self, config, database, send_mail):
+    def __init__(self, config, database, send_mail, remediation=None, shards=None):
         self.config = config
         self.database = database
         self.send_mail = send_mail
+        self.remediation = remediation
+        self.shards = shards
         self.logger = logging.getLogger('SensorHeartbeat')
+        self.hostname = config.get(self.config_group_system, self.hostname, fallback=socket.gethostname())
         self.heartbeats = {}
 
-    # If returns false an email will be sent
+    # If returns false an email will be sent.
+    # The bluetooth restart and the "lost every sensor" e-mail are decisions about the whole node, so with sharding
+    # only the instance owning the host makes them, over every sensor. The other instances only check their shards.
     def check_last_heartbeat(self):
         self.logger.debug('Checking sensors ...')
+        node_wide = not self.shards or self.shards.owns(self.hostname)
         heartbeats = {}
         timeout = float(self.config.get(self.config_group_timeouts, self.sensor_connection_error))
-        for sensor in json.loads(self.config.get(self.config_group_heartbeat, self.sensors)):
-            sensor_last_heartbeat = self.database.get_sensor_last_heartbeat(sensor)
-            name = sensor_last_heartbeat[0]['name']
-            timestamp = sensor_last_heartbeat[0]['timestamp']
-            self.logger.debug('  ' + name +
-                              '(' + sensor + ') last connection: ' + timestamp.strftime('%Y-%m-%d %H:%M:%S'))
+        for sensor, last_heartbeat in self.get_last_heartbeats(node_wide).items():
+            name = last_heartbeat['name']
+            timestamp = last_heartbeat['timestamp']
+            self.logger.debug('  %s(%s) last connection: %s', name, sensor, timestamp)
             now = datetime.now()
             difference_in_minutes = int((now - timestamp).total_seconds() / 60.0)
             heartbeats[sensor] = {
@@ -43,23 +52,29 @@ class SensorHeartbeat:
                 'error': difference_in_minutes > int(timeout)
             }
 
-        self.heartbeats = heartbeats
+        self.heartbeats = {sensor: heartbeat for sensor, heartbeat in heartbeats.items()
+                           if not self.shards or self.shards.owns(sensor)}
+        if not heartbeats:
+            self.logger.debug('No sensors to check')
+            return True
 
-        restart_needed = True
-        sensors_in_error_state = True
+        restart_needed = node_wide and all(heartbeat['half'] for heartbeat in heartbeats.values())
+        every_sensor_lost = node_wide and all(heartbeat['full'] for heartbeat in heartbeats.values())
+        sensors_in_error_state = bool(self.heartbeats) \
+            and all(heartbeat['error'] for heartbeat in self.heartbeats.values())
         email_needed = []
         error_message = ''
-        for sensor in heartbeats:
-            restart_needed &= heartbeats[sensor]['half']
-            sensors_in_error_state &= heartbeats[sensor]['error']
-            if heartbeats[sensor]['full']:
+        for sensor in self.heartbeats:
+            if self.heartbeats[sensor]['full']:
                 email_needed.append(sensor)
-                error_message += 'Lost connection with ' + heartbeats[sensor]['name'] + '(' + sensor + ')<br />\n'
+                error_message += 'Lost connection with ' + self.heartbeats[sensor]['name'] + '(' + sensor + ')<br />\n'
 
         if restart_needed:
             self.logger.info('Restarting bluetooth service')
-            os.system('sudo systemctl restart bluetooth')
-        elif len(email_needed) == len(heartbeats):
+            if self.remediation:
+                self.remediation.run(Remediation.bluetooth_restart,
+                                     Remediation.get_command(self.config, Remediation.bluetooth_restart))
+        elif every_sensor_lost:
             self.logger.error('Lost connection with every sensor')
             self.send_error_mail('Lost connection with every sensor!')
         elif len(email_needed) > 0:
@@ -72,6 +87,30 @@ class SensorHeartbeat:
 
         return True
 
+    # With auto discovery every sensor of the registry seen in the last DISCOVERY_MAX_AGE days is monitored, and their
+    # last heartbeats come from the registry in one query. The listed sensors are monitored in both cases.
+    # With sharding only the sensors of the shards leased by this instance are read, unless every sensor is needed.
+    def get_last_heartbeats(self, every_sensor=False):
+        sensors = json.loads(self.config.get(self.config_group_heartbeat, self.sensors, fallback='[]'))
+        last_heartbeats = {}
+        if self.config.getboolean(self.config_group_heartbeat, self.auto_discovery, fallback=False):
+            self.database.update_sensor_registry()
+            last_heartbeats = self.database.get_registered_sensors(
+                self.config.getint(self.config_group_heartbeat, self.discovery_max_age, fallback=7))
+        if self.shards and not every_sensor:
+            sensors = [sensor for sensor in sensors if self.shards.owns(sensor)]
+            last_heartbeats = {sensor: last_heartbeat for sensor, last_heartbeat in last_heartbeats.items()
+                               if self.shards.owns(sensor)}
+
+        for sensor in sensors:
+            if sensor not in last_heartbeats:
+                last_heartbeat = self.database.get_sensor_last_heartbeat(sensor)
+                if not last_heartbeat:
+                    self.logger.warning('No data from the %s sensor yet', sensor)
+                    continue
+                last_heartbeats[sensor] = last_heartbeat[0]
+        return last_heartbeats
+
     def get_mail_subject(self):
         return self.config.get(self.config_group_subjects, self.sensor_connection_error)
 
@@ -4,8 +4,10 @@ import json
 import logging
 from datetime import datetime
 
+from modules.alerts import AlertingChecks
 
-class Sensors:
+
+class Sensors(AlertingChecks):
     config_group_battery = 'BATTERY_LEVELS'
     config_group_temperature = 'TEMPERATURE_LEVELS'
     config_group_humidity = 'HUMIDITY_LEVELS'
@@ -21,14 +23,15 @@ class Sensors:
     humidity_min_cooldown = 'HUMIDITY_MIN_COOLDOWN'
     humidity_max = 'HUMIDITY_MAX'
     humidity_max_cooldown = 'HUMIDITY_MAX_COOLDOWN'
+    check_battery = 'BATTERY'
+    check_temperature = 'TEMPERATURE'
+    check_humidity = 'HUMIDITY'
 
     def __init__(self, config, database, send_mail, heartbeats):
-        self.config = config
-        self.database = database
-        self.send_mail = send_mail
+        super().__init__(config, database, send_mail, 'Sensors')
         self.heartbeats = heartbeats
-        self.logger = logging.getLogger('Sensors')
-        self.logger.debug(json.dumps({'heartbeats': heartbeats}))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(json.dumps({'heartbeats': heartbeats}))
         self.heartbeat_errors = []
         for sensor in heartbeats:
             if heartbeats[sensor]['error']:
@@ -46,59 +49,37 @@ class Sensors:
                 name = self.heartbeats[sensor]['name']
                 if level_warning < battery_level:
                     self.handle_normal_battery(sensor, name)
+                    self.add_result(sensor, self.check_battery, battery_level, level_warning, 'ok')
                 if level_error < battery_level <= level_warning:
                     self.handle_warning_battery(sensor, name, battery_level, level_warning)
+                    self.add_result(sensor, self.check_battery, battery_level, level_warning, 'warning')
                 if level_critical < battery_level <= level_error:
                     self.handle_error_battery(sensor, name, battery_level, level_error)
+                    self.add_result(sensor, self.check_battery, battery_level, level_error, 'error')
                 if battery_level <= level_critical:
                     self.handle_critical_battery(sensor, name, battery_level, level_critical)
+                    self.add_result(sensor, self.check_battery, battery_level, level_critical, 'critical')
 
     def handle_normal_battery(self, sensor, name):
-        self.logger.debug('{0}({1})s battery level is ok'.format(sensor, name))
-        email_notification = self.database.get_email_alert_notification(sensor, self.battery_critical)
-        if email_notification:
-            self.database.set_email_alert_notification(sensor, self.battery_critical)
+        self.logger.debug('%s(%s)s battery level is ok', sensor, name)
+        self.clear_alert(sensor, self.battery_critical)
 
     def handle_warning_battery(self, sensor, name, battery_level, level_warning):
-        self.logger.warning('{0}({1})s battery level is under {2}%'.format(sensor, name, level_warning))
-        email_notification = self.database.get_email_alert_notification(sensor, self.battery_warning)
-        if email_notification:
-            self.logger.debug('E-mail notification already sent')
-        else:
-            self.logger.info('E-mail notification needed')
-            self.send_mail.send(
-                self.get_mail_subject_battery(self.battery_warning),
-                self.get_mail_message_battery(sensor, name, battery_level)
-            )
-            self.database.set_email_alert_notification(sensor, self.battery_warning)
+        self.logger.warning('%s(%s)s battery level is under %s%%', sensor, name, level_warning)
+        self.send_alert(sensor, self.battery_warning, self.get_mail_subject_battery(self.battery_warning),
+                        self.get_mail_message_battery(sensor, name, battery_level))
 
     def handle_error_battery(self, sensor, name, battery_level, level_error):
-        self.logger.error('{0}({1})s battery level is under {2}%'.format(sensor, name, level_error))
-        email_notification = self.database.get_email_alert_notification(sensor, self.battery_error)
-        if email_notification:
-            self.logger.debug('E-mail notification already sent')
-        else:
-            self.logger.info('E-mail notification needed')
-            self.send_mail.send(
-                self.get_mail_subject_battery(self.battery_error),
-                self.get_mail_message_battery(sensor, name, battery_level)
-            )
+        self.logger.error('%s(%s)s battery level is under %s%%', sensor, name, level_error)
+        if self.send_alert(sensor, self.battery_error, self.get_mail_subject_battery(self.battery_error),
+                           self.get_mail_message_battery(sensor, name, battery_level)):
             self.database.set_email_alert_notification(sensor, self.battery_warning)
-            self.database.set_email_alert_notification(sensor, self.battery_error)
 
     def handle_critical_battery(self, sensor, name, battery_level, level_critical):
-        self.logger.critical('{0}({1})s battery level is under {2}%'.format(sensor, name, level_critical))
-        email_notification = self.database.get_email_alert_notification(sensor, self.battery_critical)
-        if email_notification:
-            self.logger.debug('E-mail notification already sent')
-        else:
-            self.logger.info('E-mail notification needed')
-            self.send_mail.send(
-                self.get_mail_subject_battery(self.battery_critical),
-                self.get_mail_message_battery(sensor, name, battery_level)
-            )
+        self.logger.critical('%s(%s)s battery level is under %s%%', sensor, name, level_critical)
+        if self.send_alert(sensor, self.battery_critical, self.get_mail_subject_battery(self.battery_critical),
+                           self.get_mail_message_battery(sensor, name, battery_level)):
             self.database.set_email_alert_notification(sensor, self.battery_error)
-            self.database.set_email_alert_notification(sensor, self.battery_critical)
 
     def check_temperature_status(self):
         self.logger.debug('Checking sensors\' temperature status ...')
@@ -113,13 +94,16 @@ class Sensors:
                 name = self.heartbeats[sensor]['name']
                 if level_min < temperature < level_max:
                     self.handle_normal_temperature(sensor, name, temperature, level_min_cooldown, level_max_cooldown)
+                    self.add_result(sensor, self.check_temperature, temperature, None, 'ok')
                 if temperature <= level_min:
                     self.handle_low_temperature(sensor, name, temperature, level_min)
+                    self.add_result(sensor, self.check_temperature, temperature, level_min, 'low')
                 if level_max <= temperature:
                     self.handle_high_temperature(sensor, name, temperature, level_max)
+                    self.add_result(sensor, self.check_temperature, temperature, level_max, 'high')
 
     def handle_normal_temperature(self, sensor, name, temperature, level_min_cooldown, level_max_cooldown):
-        self.logger.debug('{0}({1})s temperature is ok'.format(sensor, name))
+        self.logger.debug('%s(%s)s temperature is ok', sensor, name)
         email_notification = self.database.get_email_alert_notification(sensor, self.temperature_min)
         in_cooldown_zone = temperature <= level_min_cooldown
         if email_notification and not in_cooldown_zone:
@@ -130,30 +114,14 @@ class Sensors:
             self.database.set_email_alert_notification(sensor, self.temperature_max)
 
     def handle_low_temperature(self, sensor, name, temperature, level_min):
-        self.logger.warning('{0}({1})s temperature is under {2}°C'.format(sensor, name, level_min))
-        email_notification = self.database.get_email_alert_notification(sensor, self.temperature_min)
-        if email_notification:
-            self.logger.debug('E-mail notification already sent')
-        else:
-            self.logger.info('E-mail notification needed')
-            self.send_mail.send(
-                self.get_mail_subject_temperature(self.temperature_min),
-                self.get_mail_message_temperature(sensor, name, temperature)
-            )
-            self.database.set_email_alert_notification(sensor, self.temperature_min)
+        self.logger.warning('%s(%s)s temperature is under %s°C', sensor, name, level_min)
+        self.send_alert(sensor, self.temperature_min, self.get_mail_subject_temperature(self.temperature_min),
+                        self.get_mail_message_temperature(sensor, name, temperature))
 
     def handle_high_temperature(self, sensor, name, temperature, level_max):
-        self.logger.warning('{0}({1})s temperature is above {2}°C'.format(sensor, name, level_max))
-        email_notification = self.database.get_email_alert_notification(sensor, self.temperature_max)
-        if email_notification:
-            self.logger.debug('E-mail notification already sent')
-        else:
-            self.logger.info('E-mail notification needed')
-            self.send_mail.send(
-                self.get_mail_subject_temperature(self.temperature_max),
-                self.get_mail_message_temperature(sensor, name, temperature)
-            )
-            self.database.set_email_alert_notification(sensor, self.temperature_max)
+        self.logger.warning('%s(%s)s temperature is above %s°C', sensor, name, level_max)
+        self.send_alert(sensor, self.temperature_max, self.get_mail_subject_temperature(self.temperature_max),
+                        self.get_mail_message_temperature(sensor, name, temperature))
 
     def check_humidity_status(self):
         self.logger.debug('Checking sensors\' humidity status ...')
@@ -168,13 +136,16 @@ class Sensors:
                 name = self.heartbeats[sensor]['name']
                 if level_min < humidity < level_max:
                     self.handle_normal_humidity(sensor, name, humidity, level_min_cooldown, level_max_cooldown)
+                    self.add_result(sensor, self.check_humidity, humidity, None, 'ok')
                 if humidity <= level_min:
                     self.handle_low_humidity(sensor, name, humidity, level_min)
+                    self.add_result(sensor, self.check_humidity, humidity, level_min, 'low')
                 if level_max <= humidity:
                     self.handle_high_humidity(sensor, name, humidity, level_max)
+                    self.add_result(sensor, self.check_humidity, humidity, level_max, 'high')
 
     def handle_normal_humidity(self, sensor, name, humidity, level_min_cooldown, level_max_cooldown):
-        self.logger.debug('{0}({1})s humidity is ok'.format(sensor, name))
+        self.logger.debug('%s(%s)s humidity is ok', sensor, name)
         email_notification = self.database.get_email_alert_notification(sensor, self.humidity_min)
         in_cooldown_zone = humidity <= level_min_cooldown
         if email_notification and not in_cooldown_zone:
@@ -185,30 +156,14 @@ class Sensors:
             self.database.set_email_alert_notification(sensor, self.humidity_max)
 
     def handle_low_humidity(self, sensor, name, humidity, level_min):
-        self.logger.warning('{0}({1})s humidity is under {2}%'.format(sensor, name, level_min))
-        email_notification = self.database.get_email_alert_notification(sensor, self.humidity_min)
-        if email_notification:
-            self.logger.debug('E-mail notification already sent')
-        else:
-            self.logger.info('E-mail notification needed')
-            self.send_mail.send(
-                self.get_mail_subject_humidity(self.humidity_min),
-                self.get_mail_message_humidity(sensor, name, humidity)
-            )
-            self.database.set_email_alert_notification(sensor, self.humidity_min)
+        self.logger.warning('%s(%s)s humidity is under %s%%', sensor, name, level_min)
+        self.send_alert(sensor, self.humidity_min, self.get_mail_subject_humidity(self.humidity_min),
+                        self.get_mail_message_humidity(sensor, name, humidity))
 
     def handle_high_humidity(self, sensor, name, humidity, level_max):
-        self.logger.warning('{0}({1})s humidity is above {2}%'.format(sensor, name, level_max))
-        email_notification = self.database.get_email_alert_notification(sensor, self.humidity_max)
-        if email_notification:
-            self.logger.debug('E-mail notification already sent')
-        else:
-            self.logger.info('E-mail notification needed')
-            self.send_mail.send(
-                self.get_mail_subject_humidity(self.humidity_max),
-                self.get_mail_message_humidity(sensor, name, humidity)
-            )
-            self.database.set_email_alert_notification(sensor, self.humidity_max)
+        self.logger.warning('%s(%s)s humidity is above %s%%', sensor, name, level_max)
+        self.send_alert(sensor, self.humidity_max, self.get_mail_subject_humidity(self.humidity_max),
+                        self.get_mail_message_humidity(sensor, name, humidity))
 
     def get_mail_subject_battery(self, level):
         return {
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import logging
+import math
+import socket
+import zlib
+
+import psycopg2
+
+
+# Splits the sensors and hosts between the monitor instances watching the same database. The key space is cut into
+# a fixed number of shards, every instance leases its fair share of them in monitoring.monitor_leases and renews
+# the leases on each run. When an instance stops, its leases expire and the others take the shards over.
+class ShardCoordinator:
+    config_group_sharding = 'SHARDING'
+    enabled = 'ENABLED'
+    shards = 'SHARDS'
+    instance_id = 'INSTANCE_ID'
+    lease_seconds = 'LEASE_SECONDS'
+
+    def __init__(self, config, database):
+        self.config = config
+        self.database = database
+        self.logger = logging.getLogger('ShardCoordinator')
+        self.enabled = config.getboolean(self.config_group_sharding, self.enabled, fallback=False)
+        self.shards = config.getint(self.config_group_sharding, self.shards, fallback=16)
+        self.instance_id = config.get(self.config_group_sharding, self.instance_id, fallback=socket.gethostname())
+        self.lease_seconds = config.getint(self.config_group_sharding, self.lease_seconds, fallback=180)
+        # Nothing is checked with sharding until the first leases are acquired
+        self.owned = set() if self.enabled else set(range(self.shards))
+
+    def acquire(self):
+        if not self.enabled:
+            return
+
+        # A failed renewal keeps the shards of the previous cycle, the leases are still valid until they expire
+        try:
+            instances = max(1, self.database.update_monitor_instance(self.instance_id, self.lease_seconds))
+            fair_share = math.ceil(self.shards / instances)
+            owned = set(self.database.acquire_shard_leases(self.instance_id, self.shards, fair_share,
+                                                           self.lease_seconds))
+        except psycopg2.Error as error:
+            self.database.connection.rollback()
+            self.logger.warning('Renewing the shard leases of %s failed, keeping %d shards: %s',
+                                self.instance_id, len(self.owned), str(error).strip())
+            return
+        if owned != self.owned:
+            self.logger.info('%s owns %d of %d shards with %d instances alive: %s',
+                             self.instance_id, len(owned), self.shards, instances, sorted(owned))
+        self.owned = owned
+
+    def get_shard(self, key):
+        return zlib.crc32(key.encode('utf-8')) % self.shards
+
+    def owns(self, key):
+        return not self.enabled or self.get_shard(key) in self.owned
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Serves the latest evaluated state of the monitor as JSON from memory, the database is never touched by a request.
+# The body and its ETag are built once per monitoring cycle, so polling clients mostly get a bodiless 304.
+class StatusServer:
+    config_group_status = 'STATUS'
+    host = 'HOST'
+    port = 'PORT'
+
+    def __init__(self, config):
+        self.config = config
+        self.logger = logging.getLogger('StatusServer')
+        self.host = config.get(self.config_group_status, self.host, fallback='127.0.0.1')
+        self.port = config.getint(self.config_group_status, self.port, fallback=8081)
+        self.lock = threading.Lock()
+        self.body = b'{}'
+        self.etag = self.create_etag(self.body)
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        status_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/status'):
+                    self.send_error(404)
+                    return
+
+                body, etag = status_server.get()
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, message_format, *args):
+                status_server.logger.debug(message_format, *args)
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name='StatusServer', daemon=True)
+        self.thread.start()
+        self.logger.info('Serving status on http://%s:%d/status', self.host, self.port)
+
+    def update(self, status):
+        body = json.dumps(status, default=str, sort_keys=True).encode('utf-8')
+        etag = self.create_etag(body)
+        with self.lock:
+            self.body = body
+            self.etag = etag
+
+    def get(self):
+        with self.lock:
+            return self.body, self.etag
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    @staticmethod
+    def create_etag(body):
+        return '"' + hashlib.sha1(body).hexdigest() + '"'
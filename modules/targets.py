@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+
+import configparser
+import json
+import logging
+import psycopg2
+import socket
+import threading
+import time
+from datetime import datetime
+
+from modules.database import Database
+from modules.database_health import DatabaseHealth
+from modules.probes import Probes
+from modules.readings_cache import ReadingsCache
+from modules.remediation import Remediation
+from modules.deadline import DeadlineExceeded
+from modules.sensor_heartbeat import SensorHeartbeat
+from modules.sensors import Sensors
+from modules.sharding import ShardCoordinator
+from modules.system_heartbeat import SystemHeartbeat
+from modules.trends import Trends
+
+
+# One monitored site: its own database connection, sensor list, thresholds and alert state.
+# The settings of a target come from the "<name>:<SECTION>" sections, everything else is inherited from the
+# main configuration, e.g. [cabin:DATABASE] or [cabin:TEMPERATURE_LEVELS].
+class Target:
+    config_group_targets = 'TARGETS'
+    config_group_db = 'DATABASE'
+    config_group_check_results = 'CHECK_RESULTS'
+    config_group_system = 'SYSTEM_VALUES'
+    config_group_probes = 'PROBES'
+    enabled = 'ENABLED'
+    retention_months = 'RETENTION_MONTHS'
+    names = 'NAMES'
+    hostname = 'HOSTNAME'
+    temp_file = 'TEMP_FILE'
+    history_file = 'HISTORY_FILE'
+    default_name = 'default'
+
+    def __init__(self, name, config, send_mail, remediation, daemon=False):
+        self.name = name
+        self.config = config
+        self.send_mail = send_mail
+        self.remediation = remediation
+        self.daemon = daemon
+        self.logger = logging.getLogger('Target')
+        self.database = Database(config, send_mail, remediation)
+        self.readings_cache = ReadingsCache(config) if daemon else None
+        self.shards = ShardCoordinator(config, self.database)
+        self.hostname = config.get(self.config_group_system, self.hostname, fallback=socket.gethostname())
+        # Held while a check of the target is running
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, config, send_mail, remediation, daemon=False):
+        if not config.has_option(cls.config_group_targets, cls.names):
+            return [cls(cls.default_name, config, send_mail, remediation, daemon)]
+
+        return [cls(name, cls.create_config(config, name), send_mail, remediation, daemon)
+                for name in json.loads(config.get(cls.config_group_targets, cls.names))]
+
+    @classmethod
+    def create_config(cls, config, name):
+        prefix = name + ':'
+        sections = {}
+        for section in config.sections():
+            if ':' not in section:
+                sections[section] = dict(config.items(section, raw=True))
+        for section in config.sections():
+            if section.startswith(prefix):
+                sections.setdefault(section[len(prefix):], {}).update(config.items(section, raw=True))
+
+        # Every target needs its own connection error bookkeeping and probe history
+        for config_group, option in [(cls.config_group_db, cls.temp_file), (cls.config_group_probes, cls.history_file)]:
+            if not config.has_option(prefix + config_group, option) \
+                    and option.lower() in sections.get(config_group, {}):
+                sections[config_group][option.lower()] += '.' + name
+
+        # The default restart commands act on this host, a named target only restarts the services it sets itself
+        for action in Remediation.default_commands:
+            if not config.has_option(prefix + Remediation.config_group_remediation, action):
+                sections.setdefault(Remediation.config_group_remediation, {})[action.lower()] = ''
+
+        target_config = configparser.ConfigParser()
+        target_config.read_dict(sections)
+        return target_config
+
+    def check(self, deadline):
+        status = {
+            'last_check': datetime.now(),
+            'database': False,
+            'heartbeats': {},
+            'values': {},
+            'alerts': [],
+            'skipped': [],
+            'timings': {}
+        }
+        started = time.monotonic()
+        self.database.deadline = deadline
+
+        connected = self.run_step(status, deadline, 'database connection', self.database.check_status_and_connect)
+        status['timings']['database'] = time.monotonic() - started
+        if not connected:
+            status['timings']['total'] = time.monotonic() - started
+            return status
+        status['database'] = True
+
+        # Without sharding every shard is owned. With it a failed renewal keeps the shards of the previous cycle, and
+        # a process that couldn't acquire any leases yet checks nothing
+        self.run_step(status, deadline, 'shard leases', self.shards.acquire)
+        if self.shards.enabled:
+            status['shards'] = sorted(self.shards.owned)
+        database_owned = self.shards.owns(self.name + '_database')
+
+        results = []
+        step_started = time.monotonic()
+        database_health = database_owned and self.run_step(status, deadline, 'database health', lambda: DatabaseHealth(
+            self.config, self.database, self.send_mail))
+        if database_health:
+            self.run_step(status, deadline, 'connections', database_health.check_connections)
+            self.run_step(status, deadline, 'long running queries', database_health.check_long_running_queries)
+            self.run_step(status, deadline, 'idle in transaction sessions', database_health.check_idle_in_transaction)
+            self.run_step(status, deadline, 'lock waits', database_health.check_lock_waits)
+            self.run_step(status, deadline, 'cache hit ratio', database_health.check_cache_hit_ratio)
+            self.run_step(status, deadline, 'dead tuples', database_health.check_bloat)
+            results += database_health.results
+        status['timings']['database_health'] = time.monotonic() - step_started
+
+        step_started = time.monotonic()
+        probes = Probes(self.config, self.database, self.send_mail)
+        if database_owned and self.run_step(status, deadline, 'latency and ingest lag probes',
+                                            lambda: probes.measure() or True):
+            self.run_step(status, deadline, 'latency', probes.check_latency)
+            self.run_step(status, deadline, 'ingest lag', probes.check_ingest_lag)
+            results += probes.results
+        status['probes'] = probes.summary
+        status['timings']['probes'] = time.monotonic() - step_started
+
+        step_started = time.monotonic()
+        sensor_heartbeat = SensorHeartbeat(self.config, self.database, self.send_mail, self.remediation, self.shards)
+        if self.run_step(status, deadline, 'sensor heartbeats', sensor_heartbeat.check_last_heartbeat):
+            heartbeats = sensor_heartbeat.heartbeats
+            sensors = Sensors(self.config, self.database, self.send_mail, heartbeats)
+            self.run_step(status, deadline, 'battery levels', sensors.check_battery_status)
+            self.run_step(status, deadline, 'temperatures', sensors.check_temperature_status)
+            self.run_step(status, deadline, 'humidities', sensors.check_humidity_status)
+            results += sensors.results
+        status['heartbeats'] = sensor_heartbeat.heartbeats
+        status['timings']['sensors'] = time.monotonic() - step_started
+
+        step_started = time.monotonic()
+        system_heartbeat = self.shards.owns(self.hostname) and self.run_step(
+            status, deadline, 'system heartbeat', lambda: SystemHeartbeat(self.config, self.database, self.send_mail))
+        if system_heartbeat:
+            self.run_step(status, deadline, 'CPU', system_heartbeat.check_cpu)
+            self.run_step(status, deadline, 'memory', system_heartbeat.check_memory)
+            self.run_step(status, deadline, 'SD card', system_heartbeat.check_sd_card)
+            self.run_step(status, deadline, 'DEV partition', system_heartbeat.check_dev_partition)
+            self.run_step(status, deadline, 'Cloud partition', system_heartbeat.check_cloud_partition)
+            self.run_step(status, deadline, 'NAS partition', system_heartbeat.check_nas_partition)
+            results += system_heartbeat.results
+        status['timings']['system'] = time.monotonic() - step_started
+
+        if self.readings_cache:
+            step_started = time.monotonic()
+            if self.run_step(status, deadline, 'readings cache',
+                             lambda: self.readings_cache.update(self.database) or True):
+                trends = Trends(self.config, self.database, self.send_mail, self.readings_cache, self.shards)
+                self.run_step(status, deadline, 'temperature trends', trends.check_temperature_rate)
+                self.run_step(status, deadline, 'humidity trends', trends.check_humidity_rate)
+                self.run_step(status, deadline, 'CPU temperature trends', trends.check_cpu_temp_rate)
+                self.run_step(status, deadline, 'SD card usage trends', trends.check_sd_usage_rate)
+                results += trends.results
+            status['timings']['trends'] = time.monotonic() - step_started
+
+        if results and self.config.getboolean(self.config_group_check_results, self.enabled, fallback=False):
+            retention_months = self.config.getint(self.config_group_check_results, self.retention_months, fallback=0)
+            self.run_step(status, deadline, 'check results history', lambda: self.database.insert_check_results(
+                self.name, status['last_check'], results, retention_months))
+
+        for result in results:
+            status['values'].setdefault(result['name'], {})[result['check']] = result['value']
+            if result['state'] != 'ok':
+                status['alerts'].append(result)
+        status['timings']['total'] = time.monotonic() - started
+        return status
+
+    # Runs one step of the check unless the run is out of time, partial results are kept
+    def run_step(self, status, deadline, name, step):
+        if not deadline.expired():
+            try:
+                return step()
+            except DeadlineExceeded:
+                pass
+        status['skipped'].append(name)
+        deadline.skip(self.name + ': ' + name)
+        return None
+
+    # The cycle history row, written after the check with its final outcome, also when the check raised. Without a
+    # working connection there is nothing to write to, the local state file of the watchdog still has the cycle.
+    def record_cycle(self, started, outcome, error=None):
+        if self.database.connection is None or self.database.connection.closed:
+            return
+
+        self.database.deadline = None
+        try:
+            self.database.release()
+            self.database.insert_monitor_cycle(self.shards.instance_id, self.name, started, datetime.now(), outcome,
+                                               error)
+        except psycopg2.Error as exception:
+            self.logger.warning('Cannot record the cycle of the %s target: %s', self.name, exception)
+            try:
+                self.database.release()
+            except psycopg2.Error:
+                self.database.close()
+
+    # Keeps the connection for the next cycle in daemon mode
+    def finish(self):
+        if self.daemon:
+            self.database.release()
+        else:
+            self.close()
+
+    def close(self):
+        if self.database.connection is not None and not self.database.connection.closed:
+            self.database.close()
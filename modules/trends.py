@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+from datetime import datetime
+
+from modules.alerts import AlertingChecks
+
+
+# Rate-of-change checks on the readings cached in memory by the daemon. The valid alerts of a check are read in one
+# query, the database is only touched again when the state of a sensor or host changes.
+class Trends(AlertingChecks):
+    config_group_trends = 'TRENDS'
+    config_group_subjects = 'SUBJECTS'
+    window_minutes = 'WINDOW_MINUTES'
+    temperature_rate_max = 'TEMPERATURE_RATE_MAX'
+    humidity_rate_max = 'HUMIDITY_RATE_MAX'
+    cpu_temp_rate_max = 'CPU_TEMP_RATE_MAX'
+    sd_usage_rate_max = 'SD_USAGE_RATE_MAX'
+
+    def __init__(self, config, database, send_mail, readings_cache, shards=None):
+        super().__init__(config, database, send_mail, 'Trends')
+        self.readings_cache = readings_cache
+        self.shards = shards
+        self.window_minutes = config.getfloat(self.config_group_trends, self.window_minutes, fallback=60)
+        self.alerted = {}
+
+    def check_temperature_rate(self):
+        for sensor, buffer in self.readings_cache.sensors.items():
+            self.check_rate(sensor, buffer, self.readings_cache.sensor_columns.index('temperature'),
+                            self.temperature_rate_max, 3, '°C')
+
+    def check_humidity_rate(self):
+        for sensor, buffer in self.readings_cache.sensors.items():
+            self.check_rate(sensor, buffer, self.readings_cache.sensor_columns.index('humidity'),
+                            self.humidity_rate_max, 15, '%')
+
+    def check_cpu_temp_rate(self):
+        for host, buffer in self.readings_cache.hosts.items():
+            self.check_rate(host, buffer, self.readings_cache.host_columns.index('cpu_temp'),
+                            self.cpu_temp_rate_max, 20, '°C')
+
+    def check_sd_usage_rate(self):
+        for host, buffer in self.readings_cache.hosts.items():
+            self.check_rate(host, buffer, self.readings_cache.host_columns.index('sd_usage'),
+                            self.sd_usage_rate_max, 5, '%')
+
+    def check_rate(self, name, buffer, column, check, default_limit, unit):
+        if self.shards and not self.shards.owns(name):
+            return
+        rate = self.readings_cache.rate_of_change(buffer, column, self.window_minutes)
+        if rate is None:
+            return
+        limit = self.config.getfloat(self.config_group_trends, check, fallback=default_limit)
+        if check not in self.alerted:
+            self.alerted[check] = self.database.get_email_alert_names(check)
+
+        if abs(rate) < limit:
+            self.logger.debug('%s %s is ok', name, check)
+            if name in self.alerted[check]:
+                self.clear_alert(name, check)
+                self.alerted[check].discard(name)
+        else:
+            self.handle_alert(name, check, rate, limit, unit)
+        self.add_result(name, check, rate, limit, 'ok' if abs(rate) < limit else 'high')
+
+    def handle_alert(self, name, check, rate, limit, unit):
+        self.logger.warning('%s changes %.2f%s per hour, the limit is %s%s', name, rate, unit, limit, unit)
+        if name in self.alerted[check]:
+            self.logger.debug('E-mail notification already sent')
+            return
+        self.alerted[check].add(name)
+        self.send_alert(name, check, self.get_mail_subject(check), self.get_mail_message(name, rate, unit))
+
+    def get_mail_subject(self, check):
+        return self.config.get(self.config_group_subjects, check, fallback='Trend alert: ' + check)
+
+    def get_mail_message(self, name, rate, unit):
+        return \
+            '<html>' \
+            '  <body>' \
+            '    <p>The {0} value changed {1:+.2f}{2} per hour in the last {3:.0f} minutes</p>' \
+            '    <p>{4}</p>' \
+            '  </body>' \
+            '</html>'.format(name, rate, unit, self.window_minutes, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
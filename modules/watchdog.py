@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import os
+import socket
+import time
+from datetime import datetime
+
+
+# Dead man's switch of the monitor. Every run (or daemon cycle) writes its start, end, duration and outcome to a small
+# local state file, and the watchdog, started separately from cron, e-mails when a cycle fails, runs over its budget,
+# keeps getting slower or no cycle starts at all. It only reads the state file, so it works without the database.
+class Watchdog:
+    config_group_watchdog = 'WATCHDOG'
+    config_group_db = 'DATABASE'
+    config_group_deadline = 'DEADLINE'
+    config_group_subjects = 'SUBJECTS'
+    state_file = 'STATE_FILE'
+    duration_max = 'DURATION_MAX'
+    silence_max = 'SILENCE_MAX'
+    history = 'HISTORY'
+    slow_ratio = 'SLOW_RATIO'
+    temp_file = 'TEMP_FILE'
+    budget = 'BUDGET'
+    monitor_failed = 'MONITOR_FAILED'
+    monitor_overrun = 'MONITOR_OVERRUN'
+    monitor_slow = 'MONITOR_SLOW'
+    monitor_silent = 'MONITOR_SILENT'
+    outcome_ok = 'ok'
+    outcome_partial = 'partial'
+    outcome_failed = 'failed'
+    outcome_running = 'running'
+
+    def __init__(self, config, send_mail=None):
+        self.config = config
+        self.send_mail = send_mail
+        self.logger = logging.getLogger('Watchdog')
+        self.state_file = config.get(self.config_group_watchdog, self.state_file,
+                                     fallback=config.get(self.config_group_db, self.temp_file) + '.cycles')
+        self.duration_max = config.getfloat(
+            self.config_group_watchdog, self.duration_max,
+            fallback=config.getfloat(self.config_group_deadline, self.budget, fallback=10) * 2)
+        self.silence_max = config.getfloat(self.config_group_watchdog, self.silence_max, fallback=900)
+        self.history = config.getint(self.config_group_watchdog, self.history, fallback=20)
+        self.slow_ratio = config.getfloat(self.config_group_watchdog, self.slow_ratio, fallback=0.8)
+        self.hostname = socket.gethostname()
+        self.started = None
+
+    def start(self):
+        self.started = time.time()
+        state = self.read_state(self.state_file)
+        state['current'] = {'started': self.started, 'outcome': self.outcome_running, 'pid': os.getpid()}
+        self.write_state(self.state_file, state)
+
+    def finish(self, outcome, error=None):
+        finished = time.time()
+        state = self.read_state(self.state_file)
+        state.pop('current', None)
+        state['last'] = {
+            'started': self.started,
+            'finished': finished,
+            'duration': finished - self.started,
+            'outcome': outcome,
+            'error': error
+        }
+        state['durations'] = (state.get('durations', []) + [finished - self.started])[-self.history:]
+        if outcome != self.outcome_failed:
+            state['last_success'] = finished
+        self.write_state(self.state_file, state)
+        self.logger.debug('Cycle finished in %.3f seconds: %s', finished - self.started, outcome)
+
+    @staticmethod
+    def read_state(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    # Written to a temporary file and renamed, so the watchdog never reads a half-written state
+    @staticmethod
+    def write_state(path, state):
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+        os.replace(path + '.tmp', path)
+
+    def check(self):
+        now = time.time()
+        state = self.read_state(self.state_file)
+        current = state.get('current')
+        last = state.get('last')
+        problems = {}
+
+        if current and now - current['started'] > self.duration_max:
+            problems[self.monitor_overrun] = 'The cycle started at {0} is still running after {1:.0f} seconds'.format(
+                self.format_time(current['started']), now - current['started'])
+        elif last and last['duration'] > self.duration_max:
+            problems[self.monitor_overrun] = 'The last cycle took {0:.1f} seconds, the budget is {1:.0f}'.format(
+                last['duration'], self.duration_max)
+
+        if last and last['outcome'] == self.outcome_failed:
+            problems[self.monitor_failed] = 'The cycle started at {0} failed: {1}'.format(
+                self.format_time(last['started']), last['error'])
+
+        durations = state.get('durations', [])
+        if len(durations) >= max(1, self.history // 2) \
+                and sum(durations) / len(durations) > self.duration_max * self.slow_ratio:
+            problems[self.monitor_slow] = 'The last {0} cycles took {1:.1f} seconds on average, the budget is ' \
+                                          '{2:.0f}'.format(len(durations), sum(durations) / len(durations),
+                                                           self.duration_max)
+
+        latest = max([cycle['started'] for cycle in (current, last) if cycle] or [0])
+        if not latest:
+            problems[self.monitor_silent] = 'No monitoring cycle has been recorded in {0}'.format(self.state_file)
+        elif now - latest > self.silence_max:
+            problems[self.monitor_silent] = 'No monitoring cycle started since {0}'.format(self.format_time(latest))
+
+        self.notify(problems)
+        return problems
+
+    # Every problem is e-mailed once, until it disappears
+    def notify(self, problems):
+        alerts_file = self.state_file + '.alerts'
+        alerted = self.read_state(alerts_file).get('alerted', [])
+        for check, message in problems.items():
+            self.logger.error(message)
+            if check in alerted:
+                self.logger.debug('E-mail notification already sent')
+                continue
+            self.logger.info('E-mail notification needed')
+            # A hung SMTP server must not block the watchdog cron job either
+            self.send_mail.send(self.get_mail_subject(check), self.get_mail_message(message), timeout=self.duration_max)
+        for check in alerted:
+            if check not in problems:
+                self.logger.info('%s is resolved', check)
+        self.write_state(alerts_file, {'alerted': sorted(problems)})
+
+    @staticmethod
+    def format_time(timestamp):
+        return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+    def get_mail_subject(self, check):
+        return self.config.get(self.config_group_subjects, check, fallback='Monitoring watchdog: ' + check)
+
+    def get_mail_message(self, message):
+        return \
+            '<html>' \
+            '  <body>' \
+            '    <p>Database monitoring on {0}: {1}</p>' \
+            '    <p>{2}</p>' \
+            '  </body>' \
+            '</html>'.format(self.hostname, message, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
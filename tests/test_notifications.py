@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import configparser
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from modules.notifications import NotificationDispatcher
+
+
+# Stand-in for the webhook endpoint, answers the requests with the queued status codes and then with 200
+class WebhookStandIn(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append(json.loads(body))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class NotificationDispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), WebhookStandIn)
+        self.server.requests = []
+        self.server.statuses = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def create_dispatcher(self, **settings):
+        config = configparser.ConfigParser()
+        config['NOTIFICATIONS'] = {'SINKS': '["hook"]'}
+        config['SINK_HOOK'] = dict({
+            'TYPE': 'webhook',
+            'URL': 'http://127.0.0.1:{0}/'.format(self.server.server_address[1]),
+            'TIMEOUT': '5',
+            'RETRY_DELAY': '0.01'
+        }, **settings)
+        return NotificationDispatcher(config)
+
+    def test_retries_until_sent(self):
+        self.server.statuses = [500, 503]
+        dispatcher = self.create_dispatcher(RETRIES='2')
+        failures = []
+        dispatcher.send('subject', 'message', on_failure=lambda: failures.append('subject'))
+
+        self.assertTrue(dispatcher.flush(10))
+        self.assertEqual(failures, [])
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.server.requests[-1]['subject'], 'subject')
+        stats = dispatcher.get_stats()['hook']
+        self.assertEqual((stats['sent'], stats['failed'], stats['pending']), (1, 0, 0))
+
+    def test_gives_up_after_the_retries(self):
+        self.server.statuses = [500] * 10
+        dispatcher = self.create_dispatcher(RETRIES='1')
+        failures = []
+        dispatcher.send('subject', 'message', on_failure=lambda: failures.append('subject'))
+
+        self.assertTrue(dispatcher.flush(10))
+        self.assertEqual(failures, ['subject'])
+        self.assertEqual(len(self.server.requests), 2)
+        stats = dispatcher.get_stats()['hook']
+        self.assertEqual((stats['sent'], stats['failed']), (0, 1))
+
+    def test_drops_over_the_rate_limit(self):
+        dispatcher = self.create_dispatcher(RATE_PER_MINUTE='0.01', BURST='2', TIMEOUT='0.5')
+        for number in range(4):
+            dispatcher.send('subject {0}'.format(number), 'message')
+
+        self.assertTrue(dispatcher.flush(10))
+        self.assertEqual([request['subject'] for request in self.server.requests], ['subject 0', 'subject 1'])
+        stats = dispatcher.get_stats()['hook']
+        self.assertEqual((stats['sent'], stats['dropped']), (2, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
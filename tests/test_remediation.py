@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+import configparser
+import os
+import tempfile
+import unittest
+
+from modules.remediation import Remediation
+
+
+class RemediationTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = configparser.ConfigParser()
+        self.config['DATABASE'] = {'TEMP_FILE': os.path.join(self.directory.name, 'monitoring')}
+        self.config['REMEDIATION'] = {'TIMEOUT': '0.5', 'COOLDOWN': '600'}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_kills_the_action_after_the_timeout(self):
+        remediation = Remediation(self.config)
+        self.assertTrue(remediation.run(Remediation.postgresql_restart, 'sleep 30'))
+
+        self.assertTrue(remediation.wait(10))
+        outcome = remediation.get_stats()['outcomes'][-1]
+        self.assertTrue(outcome['timed_out'])
+        self.assertFalse(outcome['success'])
+        self.assertLess(outcome['duration'], 10)
+        self.assertEqual(remediation.get_stats()['running'], [])
+
+    def test_cooldown_holds_for_the_next_run(self):
+        remediation = Remediation(self.config)
+        self.assertTrue(remediation.run(Remediation.postgresql_restart, 'true'))
+        self.assertTrue(remediation.wait(10))
+
+        self.assertFalse(remediation.run(Remediation.postgresql_restart, 'true'))
+        self.assertFalse(Remediation(self.config).run(Remediation.postgresql_restart, 'true'))
+
+    def test_running_action_is_not_started_again_by_the_next_run(self):
+        self.config['REMEDIATION']['COOLDOWN'] = '0'
+        remediation = Remediation(self.config)
+        self.assertTrue(remediation.run(Remediation.bluetooth_restart, 'sleep 30'))
+
+        self.assertFalse(Remediation(self.config).run(Remediation.bluetooth_restart, 'sleep 30'))
+        self.assertTrue(remediation.wait(10))
+
+    def test_target_without_a_command_is_skipped(self):
+        remediation = Remediation(self.config)
+        self.assertFalse(remediation.run(Remediation.postgresql_restart, ''))
+        self.assertEqual(remediation.get_stats()['outcomes'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import configparser
+import unittest
+from datetime import datetime, timedelta
+
+from modules.replay import Replay
+from modules.sensors import Sensors
+
+SENSOR = 'A4:C1:38:00:00:01'
+
+
+# Stand-in for the database, streams the given sensor_data rows in batches and no rpi_data rows
+class FakeDatabase:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def stream_sensor_data(self, batch_size, sensors):
+        rows = [row for row in self.rows if row[0] in sensors]
+        for start in range(0, len(rows), batch_size):
+            yield rows[start:start + batch_size]
+
+    def stream_system_data(self, batch_size):
+        return iter([])
+
+
+class ReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.config = configparser.ConfigParser()
+        self.config.read_dict({
+            'HEARTBEAT': {'SENSORS': '["{0}"]'.format(SENSOR)},
+            'TIMEOUTS': {'SENSOR_CONNECTION_ERROR': '30'},
+            'BATTERY_LEVELS': {'BATTERY_WARNING': '20', 'BATTERY_ERROR': '10', 'BATTERY_CRITICAL': '5'},
+            'TEMPERATURE_LEVELS': {'TEMPERATURE_MIN': '10', 'TEMPERATURE_MIN_COOLDOWN': '12',
+                                   'TEMPERATURE_MAX': '30', 'TEMPERATURE_MAX_COOLDOWN': '28'},
+            'HUMIDITY_LEVELS': {'HUMIDITY_MIN': '20', 'HUMIDITY_MIN_COOLDOWN': '25',
+                                'HUMIDITY_MAX': '80', 'HUMIDITY_MAX_COOLDOWN': '75'},
+            'SYSTEM_VALUES': {'CPU_TEMP_MAX': '80', 'CPU_USAGE_MAX': '90', 'MEM_USAGE_MAX': '90',
+                              'SD_USAGE_MAX': '90', 'DEV_USAGE_MAX': '90', 'CLOUD_USAGE_MAX': '90',
+                              'NAS_USAGE_MAX': '90'},
+            'REPLAY': {'BATCH_SIZE': '3', 'CYCLE_SECONDS': '60'}
+        })
+
+    @staticmethod
+    def create_rows(temperatures, step_seconds=60):
+        started = datetime(2026, 1, 1)
+        return [(SENSOR, started + timedelta(seconds=step_seconds * number), 90.0, temperature, 50.0)
+                for number, temperature in enumerate(temperatures)]
+
+    def test_low_cooldown_and_reset(self):
+        # Low, still low, back inside the cooldown zone (no reset), low again, reset, low again
+        replay = Replay(self.config, FakeDatabase(self.create_rows([15, 9, 8, 11, 9, 13, 9])))
+        report = replay.run()
+
+        self.assertEqual(report[Sensors.temperature_min], {'alerts': 4, 'mails': 2})
+        self.assertEqual(report[Sensors.temperature_max], {'alerts': 0, 'mails': 0})
+
+    def test_counts_once_per_cycle(self):
+        # Six rows per cycle, only the first row of every cycle is what a live run would have checked
+        temperatures = [15] * 6 + [9] * 6 + [13] * 6 + [9] * 6
+        replay = Replay(self.config, FakeDatabase(self.create_rows(temperatures, step_seconds=10)))
+        report = replay.run()
+
+        self.assertEqual(replay.rows['sensor_data'], 24)
+        self.assertEqual(report[Sensors.temperature_min], {'alerts': 2, 'mails': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()